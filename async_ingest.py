@@ -0,0 +1,176 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from batch_runner import write_quarantine_report
+
+QUARANTINE_PATH = "quarantine.json"  # report of the pages that failed
+
+
+class DirectorySource:
+    """
+    Reads page bytes from a local or network mounted directory. The
+    blocking reads run in a thread pool of `max_workers` so a slow mount
+    only stalls the read, not the event loop.
+    """
+
+    def __init__(self, directory, max_workers=16):
+        self.directory = directory
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def list(self):
+        return sorted(
+            entry.name
+            for entry in os.scandir(self.directory)
+            if entry.is_file()
+        )
+
+    def _read(self, name):
+        with open(os.path.join(self.directory, name), 'rb') as f:
+            return f.read()
+
+    async def read(self, name):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._read, name)
+
+
+def decode_image(data):
+    import cv2
+    import numpy as np
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("could not decode image")
+    return image
+
+
+async def ingest(
+    source,
+    names,
+    stage,
+    sink,
+    concurrency=16,
+    queue_size=8,
+    decode=decode_image,
+    decode_workers=4,
+    stage_executor=None,
+):
+    """
+    Runs pages through fetch -> decode -> stage -> sink.
+
+    Up to `concurrency` pages are fetched from `source` at once (bounded by
+    a semaphore) and decoded in a thread pool. Decoded pages wait in a
+    bounded queue of `queue_size`, so fetching pauses when the CPU bound
+    `stage(name, image)` falls behind. `stage` runs in `stage_executor`
+    (a single thread by default, to keep the model on one thread) and its
+    result is passed to the async `sink(name, result)`.
+
+    Returns a dict of per-page errors keyed by name.
+    """
+    loop = asyncio.get_running_loop()
+    pages = asyncio.Queue(maxsize=queue_size)
+    semaphore = asyncio.Semaphore(concurrency)
+    errors = {}
+    writes = set()
+    decode_executor = ThreadPoolExecutor(max_workers=decode_workers)
+    own_stage_executor = stage_executor is None
+    if own_stage_executor:
+        stage_executor = ThreadPoolExecutor(max_workers=1)
+
+    async def fetch(name):
+        # the semaphore is held until the page is queued, so pages
+        # waiting for room in the queue count against `concurrency` too
+        try:
+            data = await source.read(name)
+            image = await loop.run_in_executor(decode_executor, decode, data)
+            await pages.put((name, image))
+        except Exception as e:
+            errors[name] = f"fetch: {e}"
+        finally:
+            semaphore.release()
+
+    async def produce():
+        fetches = set()
+        for name in names:
+            await semaphore.acquire()
+            task = asyncio.create_task(fetch(name))
+            fetches.add(task)
+            task.add_done_callback(fetches.discard)
+        await asyncio.gather(*fetches)
+        await pages.put(None)
+
+    async def write(name, result):
+        try:
+            await sink(name, result)
+        except Exception as e:
+            errors[name] = f"write: {e}"
+
+    async def consume():
+        while True:
+            item = await pages.get()
+            if item is None:
+                break
+            name, image = item
+            try:
+                result = await loop.run_in_executor(stage_executor, stage, name, image)
+            except Exception as e:
+                errors[name] = f"stage: {e}"
+                continue
+            task = asyncio.create_task(write(name, result))
+            writes.add(task)
+            task.add_done_callback(writes.discard)
+
+    try:
+        await asyncio.gather(produce(), consume())
+        await asyncio.gather(*writes)
+    finally:
+        decode_executor.shutdown(wait=False)
+        if own_stage_executor:
+            stage_executor.shutdown(wait=False)
+    return errors
+
+
+def run(input_dir, json_dir, model_path, concurrency=16, file_list="", quarantine_path=QUARANTINE_PATH):
+    """
+    Deskews and runs inference on every image in `input_dir`, fetching
+    pages concurrently and writing the JSONs asynchronously.
+
+    Failed pages are skipped. Every run writes its summary, like
+    batch_runner.run_pages returns it, to `quarantine_path` and returns it.
+    """
+    import deskew_clustering
+    import inference
+
+    model = inference.load_model(model_path)
+    os.makedirs(json_dir, exist_ok=True)
+    source = DirectorySource(input_dir, concurrency)
+    files = inference.get_input_files(input_dir, file_list)
+    count = len(files)
+    done = 0
+    start = time.perf_counter()
+
+    def stage(name, image):
+        deskewed, _, angle = deskew_clustering.deskew(image)
+        return inference.detect(name, deskewed, angle, model)
+
+    async def sink(name, data):
+        nonlocal done
+        await asyncio.to_thread(inference.save_json_file, data, json_dir)
+        done += 1
+        now = time.perf_counter() - start
+        inference.print_flush(f"processed image {done}/{count} ({now/done*1000:.0f} ms per img)")
+
+    errors = asyncio.run(ingest(source, files, stage, sink, concurrency))
+    for name, error in errors.items():
+        inference.print_flush(f"failed {name}: {error}")
+    summary = {
+        "done": done,
+        "quarantined": [
+            {"key": name, "reason": "error", "attempts": 1, "error": error}
+            for name, error in errors.items()
+        ],
+        "restarts": 0,
+    }
+    write_quarantine_report(summary, quarantine_path)
+    if errors:
+        inference.print_flush(f"{len(errors)}/{count} pages failed, see {quarantine_path}")
+    return summary
@@ -0,0 +1,193 @@
+import json
+import time
+import multiprocessing as mp
+from collections import Counter, deque
+from multiprocessing import connection
+
+PAGE_TIMEOUT = 120.0  # seconds one page may take before its worker is killed
+START_TIMEOUT = 600.0  # seconds a worker may take to initialise (load the model)
+MAX_ATTEMPTS = 2  # timeouts/crashes of a page before it is quarantined
+MAX_START_FAILURES = 5  # workers failing to start in a row before giving up
+
+
+def _worker_main(conn, work, init, init_args):
+    """
+    Loop of one worker process: initialise, report ready, then run the
+    tasks sent by the parent one at a time.
+    """
+    if init is not None:
+        init(*init_args)
+    conn.send(("ready", None, None))
+    while True:
+        task = conn.recv()
+        if task is None:
+            break
+        key, args = task
+        try:
+            work(*args)
+        except Exception as e:
+            conn.send(("error", key, f"{type(e).__name__}: {e}"))
+        else:
+            conn.send(("done", key, None))
+
+
+class _Worker:
+    """
+    Parent side handle of one worker process. Every worker has its own
+    pipe, so killing it can't corrupt the channel of the others.
+    """
+
+    def __init__(self, ctx, slot, work, init, init_args):
+        self.slot = slot
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(child_conn, work, init, init_args),
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+        self.task = None
+        self.started = time.monotonic()
+
+    def assign(self, task):
+        self.conn.send(task)
+        self.task = task
+        self.started = time.monotonic()
+
+    def stop(self):
+        if self.ready:
+            try:
+                self.conn.send(None)
+            except OSError:
+                pass
+            self.process.join(timeout=5)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+def run_pages(
+    tasks,
+    work,
+    workers=3,
+    init=None,
+    init_args=None,
+    page_timeout=PAGE_TIMEOUT,
+    max_attempts=MAX_ATTEMPTS,
+    on_done=None,
+    start_timeout=START_TIMEOUT,
+):
+    """
+    Runs `work(*args)` for every (key, args) in `tasks` on `workers`
+    processes, one page per worker at a time.
+
+    A worker that runs a page longer than `page_timeout` seconds, or
+    dies on it, is killed and replaced without touching the pages the
+    other workers are on. Such pages are retried until they used up
+    `max_attempts`; pages raising an exception are not retried. Either way
+    the page ends up in the returned quarantine list and the batch goes on.
+
+    `init(*init_args[slot])` runs once in every worker process (again after
+    a restart), e.g. to load the model; `init_args` has one tuple per
+    worker slot. A worker that dies in `init` or doesn't finish it within
+    `start_timeout` seconds is restarted as well; after MAX_START_FAILURES
+    of those in a row the run is aborted. `on_done(key, done, total)` is
+    called in the parent after every successful page.
+
+    Returns {"done": count, "quarantined": [...], "restarts": count}.
+    """
+    ctx = mp.get_context()
+    pending = deque(tasks)
+    total = len(pending)
+    init_args = init_args or [()] * workers
+    attempts = Counter()
+    quarantined = []
+    done = 0
+    restarts = 0
+    start_failures = 0
+
+    def spawn(slot):
+        return _Worker(ctx, slot, work, init, init_args[slot])
+
+    def fail(task, reason, error):
+        key, _ = task
+        attempts[key] += 1
+        if reason == "error" or attempts[key] >= max_attempts:
+            quarantined.append({
+                "key": key,
+                "reason": reason,
+                "attempts": attempts[key],
+                "error": error,
+            })
+        else:
+            pending.append(task)
+
+    pool = [spawn(slot) for slot in range(workers)]
+    try:
+        while pending or any(w.task is not None for w in pool):
+            for w in pool:
+                if w.ready and w.task is None and pending:
+                    w.assign(pending.popleft())
+
+            ready = connection.wait(
+                [w.conn for w in pool] + [w.process.sentinel for w in pool],
+                timeout=min(1.0, page_timeout),
+            )
+            now = time.monotonic()
+            for i, w in enumerate(pool):
+                if w.conn in ready:
+                    try:
+                        status, key, error = w.conn.recv()
+                    except (EOFError, OSError):
+                        status = None  # died, handled below
+                    if status == "ready":
+                        w.ready = True
+                        start_failures = 0
+                    elif status == "done":
+                        w.task = None
+                        done += 1
+                        if on_done is not None:
+                            on_done(key, done, total)
+                    elif status == "error":
+                        fail(w.task, "error", error)
+                        w.task = None
+
+                alive = w.process.is_alive()
+                if not w.ready and (not alive or now - w.started > start_timeout):
+                    start_failures += 1
+                    if start_failures >= MAX_START_FAILURES:
+                        reason = f"exit code {w.process.exitcode}" if not alive else f"not ready after {start_timeout:.0f}s"
+                        raise RuntimeError(f"workers keep failing to start ({reason})")
+                    w.kill()
+                    pool[i] = spawn(w.slot)
+                    restarts += 1
+                elif not alive:
+                    if w.task is not None:
+                        fail(w.task, "crashed", f"worker exited with code {w.process.exitcode}")
+                    w.kill()
+                    pool[i] = spawn(w.slot)
+                    restarts += 1
+                elif w.task is not None and now - w.started > page_timeout:
+                    fail(w.task, "timeout", f"no result after {page_timeout:.0f}s")
+                    w.kill()
+                    pool[i] = spawn(w.slot)
+                    restarts += 1
+    finally:
+        for w in pool:
+            w.stop()
+
+    return {"done": done, "quarantined": quarantined, "restarts": restarts}
+
+
+def write_quarantine_report(summary, path):
+    """
+    Writes a `run_pages` summary, with its quarantined pages, as JSON.
+    """
+    with open(path, 'w') as f:
+        json.dump(summary, f, indent=2)
@@ -0,0 +1,291 @@
+import numpy as np
+
+DENSE_MAX_BOXES = 64  # above this, overlapping_pairs sweeps instead of a full matrix
+
+
+class Boxes:
+    """
+    Array of boxes for one page.
+
+    Stored as an Nx4 float array of [x1, y1, x2, y2] corners with a
+    category id and score per box. The JSON outputs use [x, y, width,
+    height], see `from_xywh` / `xywh`.
+    """
+
+    __slots__ = ("xyxy", "labels", "scores")
+
+    def __init__(self, xyxy, labels=None, scores=None):
+        self.xyxy = np.asarray(xyxy, dtype=np.float64).reshape(-1, 4)
+        n = len(self.xyxy)
+        self.labels = np.zeros(n, dtype=np.int64) if labels is None else np.asarray(labels, dtype=np.int64)
+        self.scores = np.ones(n, dtype=np.float64) if scores is None else np.asarray(scores, dtype=np.float64)
+
+    @classmethod
+    def from_xywh(cls, xywh, labels=None, scores=None):
+        xywh = np.asarray(xywh, dtype=np.float64).reshape(-1, 4)
+        xyxy = xywh.copy()
+        xyxy[:, 2:] += xyxy[:, :2]
+        return cls(xyxy, labels, scores)
+
+    def __len__(self):
+        return len(self.xyxy)
+
+    def __getitem__(self, index):
+        return Boxes(self.xyxy[index], self.labels[index], self.scores[index])
+
+    @property
+    def xywh(self):
+        xywh = self.xyxy.copy()
+        xywh[:, 2:] -= xywh[:, :2]
+        return xywh
+
+    @property
+    def widths(self):
+        return self.xyxy[:, 2] - self.xyxy[:, 0]
+
+    @property
+    def heights(self):
+        return self.xyxy[:, 3] - self.xyxy[:, 1]
+
+    @property
+    def areas(self):
+        return np.clip(self.widths, 0, None) * np.clip(self.heights, 0, None)
+
+    def scale(self, factor):
+        return Boxes(self.xyxy * factor, self.labels, self.scores)
+
+
+def intersection_matrix(a, b):
+    """
+    Pairwise intersection areas of two Nx4 and Mx4 xyxy arrays, NxM.
+    """
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    return np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+
+
+def _areas(xyxy):
+    return np.clip(xyxy[:, 2] - xyxy[:, 0], 0, None) * np.clip(xyxy[:, 3] - xyxy[:, 1], 0, None)
+
+
+def iou_matrix(a, b):
+    """
+    Pairwise IoU of two Nx4 and Mx4 xyxy arrays. Pairs with zero union
+    get 0.
+    """
+    inter = intersection_matrix(a, b)
+    union = _areas(a)[:, None] + _areas(b)[None, :] - inter
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(union > 0, inter / union, 0.0)
+
+
+def containment_matrix(a, b):
+    """
+    Fraction of each box in `a` covered by each box in `b`, NxM.
+    """
+    inter = intersection_matrix(a, b)
+    area = _areas(a)[:, None]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(area > 0, inter / area, 0.0)
+
+
+def pair_iou(a, b):
+    """
+    IoU of row-aligned pairs, a[k] with b[k].
+    """
+    x1 = np.maximum(a[:, 0], b[:, 0])
+    y1 = np.maximum(a[:, 1], b[:, 1])
+    x2 = np.minimum(a[:, 2], b[:, 2])
+    y2 = np.minimum(a[:, 3], b[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    union = _areas(a) + _areas(b) - inter
+    with np.errstate(divide="ignore", invalid="ignore"):
+        iou = np.where(union > 0, inter / union, 0.0)
+        small = np.minimum(_areas(a), _areas(b))
+        contain = np.where(small > 0, inter / small, 0.0)
+    return iou, contain
+
+
+def _sweep(lo, hi):
+    """
+    Sorts the [lo, hi] intervals by `lo`. Returns the order and, for each
+    interval in that order, how many of the following ones start inside it.
+    """
+    order = np.argsort(lo, kind="stable")
+    ends = np.searchsorted(lo[order], hi[order], side="right")
+    return order, np.clip(ends - np.arange(len(lo)) - 1, 0, None)
+
+
+def candidate_pairs(xyxy):
+    """
+    All (i, j) with i < j whose boxes overlap or touch, as two arrays.
+
+    Sort and sweep along the axis where fewer intervals overlap (y for
+    pages of text lines), then keep the pairs that overlap along the other
+    one as well. Unlike a grid, large boxes cost no more than small ones.
+    """
+    xyxy = np.asarray(xyxy, dtype=np.float64).reshape(-1, 4)
+    sweeps = [_sweep(xyxy[:, axis], xyxy[:, axis + 2]) for axis in (0, 1)]
+    axis = 0 if sweeps[0][1].sum() <= sweeps[1][1].sum() else 1
+    order, counts = sweeps[axis]
+    i = np.repeat(np.arange(len(order)), counts)
+    j = i + 1 + np.arange(len(i)) - np.repeat(np.cumsum(counts) - counts, counts)
+    i, j = order[i], order[j]
+    other = 1 - axis
+    hit = (xyxy[j, other] <= xyxy[i, other + 2]) & (xyxy[i, other] <= xyxy[j, other + 2])
+    i, j = i[hit], j[hit]
+    return np.minimum(i, j), np.maximum(i, j)
+
+
+def _union_find(n, i, j):
+    parent = np.arange(n)
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b in zip(i.tolist(), j.tolist()):
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+    return np.array([find(x) for x in range(n)], dtype=np.int64)
+
+
+def overlapping_pairs(boxes, iou_threshold=0.7, containment_threshold=0.95, class_aware=True):
+    """
+    Pairs (i, j) of boxes that overlap by more than `iou_threshold` IoU or
+    where the smaller box is covered more than `containment_threshold`.
+    Only boxes with the same label are paired when `class_aware`.
+
+    Up to DENSE_MAX_BOXES boxes the full intersection matrix is cheapest;
+    above that only the pairs from `candidate_pairs` are tested.
+    """
+    n = len(boxes)
+    if n <= DENSE_MAX_BOXES:
+        inter = intersection_matrix(boxes.xyxy, boxes.xyxy)
+        areas = boxes.areas
+        union = areas[:, None] + areas[None, :] - inter
+        small = np.minimum(areas[:, None], areas[None, :])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            hit = (np.where(union > 0, inter / union, 0.0) > iou_threshold) | (
+                np.where(small > 0, inter / small, 0.0) > containment_threshold
+            )
+        if class_aware:
+            hit &= boxes.labels[:, None] == boxes.labels[None, :]
+        i, j = np.nonzero(np.triu(hit, k=1))
+        return i, j
+    i, j = candidate_pairs(boxes.xyxy)
+    if class_aware:
+        same = boxes.labels[i] == boxes.labels[j]
+        i, j = i[same], j[same]
+    iou, contain = pair_iou(boxes.xyxy[i], boxes.xyxy[j])
+    hit = (iou > iou_threshold) | (contain > containment_threshold)
+    return i[hit], j[hit]
+
+
+def merge_overlapping(boxes, iou_threshold=0.7, containment_threshold=0.95, class_aware=True):
+    """
+    Merges groups of duplicate boxes (see `overlapping_pairs`) into their
+    enclosing box with the highest score of the group. Returns the merged
+    Boxes and, for each of them, the index of the input box it replaces
+    (the highest scoring one).
+    """
+    n = len(boxes)
+    if n < 2:
+        return boxes, np.arange(n)
+    i, j = overlapping_pairs(boxes, iou_threshold, containment_threshold, class_aware)
+    if len(i) == 0:
+        return boxes, np.arange(n)
+    groups = _union_find(n, i, j)
+    roots, inverse = np.unique(groups, return_inverse=True)
+    k = len(roots)
+    xyxy = np.empty((k, 4))
+    xyxy[:, :2] = np.inf
+    xyxy[:, 2:] = -np.inf
+    np.minimum.at(xyxy[:, 0], inverse, boxes.xyxy[:, 0])
+    np.minimum.at(xyxy[:, 1], inverse, boxes.xyxy[:, 1])
+    np.maximum.at(xyxy[:, 2], inverse, boxes.xyxy[:, 2])
+    np.maximum.at(xyxy[:, 3], inverse, boxes.xyxy[:, 3])
+    # representative = highest scoring box of each group
+    order = np.lexsort((-boxes.scores, inverse))
+    first = np.ones(n, dtype=bool)
+    first[1:] = inverse[order][1:] != inverse[order][:-1]
+    keep = order[first]
+    return Boxes(xyxy, boxes.labels[keep], boxes.scores[keep]), keep
+
+
+def suppress_overlapping(boxes, iou_threshold=0.7, containment_threshold=0.95, class_aware=True):
+    """
+    Greedy non-maximum suppression: drops every box that overlaps a higher
+    scoring one. Returns the indices of the kept boxes, in input order.
+    """
+    n = len(boxes)
+    i, j = overlapping_pairs(boxes, iou_threshold, containment_threshold, class_aware)
+    if len(i) == 0:
+        return np.arange(n)
+    # orient every pair as (stronger, weaker)
+    stronger_first = (boxes.scores[i] > boxes.scores[j]) | ((boxes.scores[i] == boxes.scores[j]) & (i < j))
+    strong = np.where(stronger_first, i, j)
+    weak = np.where(stronger_first, j, i)
+    by_score = np.lexsort((np.arange(n), -boxes.scores))
+    rank = np.empty(n, dtype=np.int64)
+    rank[by_score] = np.arange(n)
+    pairs = sorted(zip(rank[strong].tolist(), weak.tolist()))
+    suppressed = np.zeros(n, dtype=bool)
+    for strong_rank, w in pairs:
+        if not suppressed[by_score[strong_rank]]:
+            suppressed[w] = True
+    return np.flatnonzero(~suppressed)
+
+
+def _columns(xyxy):
+    """
+    Column id per box: boxes whose x-ranges overlap (transitively) share a
+    column. Column ids increase left to right.
+    """
+    order = np.argsort(xyxy[:, 0], kind="stable")
+    x1 = xyxy[order, 0]
+    x2 = xyxy[order, 2]
+    reach = np.maximum.accumulate(x2)
+    starts = np.ones(len(order), dtype=bool)
+    # small tolerance so touching boxes don't split a column
+    starts[1:] = x1[1:] > reach[:-1] - 1e-6
+    column = np.empty(len(order), dtype=np.int64)
+    column[order] = np.cumsum(starts) - 1
+    return column
+
+
+def reading_order(boxes, page_width=None, span_ratio=0.6):
+    """
+    Indices that sort `boxes` into reading order.
+
+    Boxes wider than `span_ratio` of the page (titles, full width tables
+    and figures) split the page into horizontal bands. Inside each band the
+    remaining boxes are grouped into columns by overlapping x-ranges and
+    read column by column, top to bottom.
+    """
+    n = len(boxes)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    xyxy = boxes.xyxy
+    if page_width is None:
+        page_width = xyxy[:, 2].max() - min(xyxy[:, 0].min(), 0)
+    spanning = boxes.widths > span_ratio * page_width
+
+    # band id: number of spanning boxes whose top is at or above the box's
+    # top, so a spanning box opens the band of the boxes below it
+    span_tops = np.sort(xyxy[spanning, 1])
+    band = np.searchsorted(span_tops, xyxy[:, 1], side="right")
+
+    column = np.full(n, -1, dtype=np.int64)
+    regular = np.flatnonzero(~spanning)
+    for b in np.unique(band[regular]):
+        members = regular[band[regular] == b]
+        column[members] = _columns(xyxy[members])
+
+    # sort by band, spanning boxes first, then column, then top, then left
+    return np.lexsort((xyxy[:, 0], xyxy[:, 1], column, ~spanning, band))
@@ -1,14 +1,11 @@
 import os
-from concurrent.futures import ProcessPoolExecutor, as_completed
-from doclayout_yolo import YOLOv10
-from inference import process, print_flush
+from batch_runner import run_pages, write_quarantine_report, PAGE_TIMEOUT
+from inference import process, print_flush, get_input_files, MODEL_PATH, QUARANTINE_PATH
+from worker_setup import setup_worker, default_threads, cpu_sets, available_cpus
 
 IMG_DIR = "PS05_SHORTLIST_DATA/images"
 JSON_OUTPUT_DIR = "output_json/"
 
-# Create output directory if it doesn't exist
-os.makedirs(JSON_OUTPUT_DIR, exist_ok=True)
-
 category_mapping = {
     0: {"id": 2, "name": "Title"},
     1: {"id": 1, "name": "Text"},
@@ -24,21 +21,66 @@ category_mapping = {
 
 
 
-def proc(img_dir, img_filename, json_dir, i, count):
-    model = YOLOv10("models/docLayout.pt")
-    print_flush(f"processing image {i+1}/{count}")
+# model of the current worker process, loaded once by init_worker
+_model = None
+
+
+def init_worker(model_path, threads=None, cpus=None, warmup_passes=1):
+    global _model
+    _model = setup_worker(model_path, threads, cpus, warmup_passes)
+
+
+def proc(img_dir, img_filename, json_dir):
     img_path = os.path.join(img_dir, img_filename)
-    process(img_filename, img_path, model, json_dir)
+    process(img_filename, img_path, _model, json_dir)
 
 
-if __name__ == "__main__":
+def run(img_dir, json_dir, model_path=MODEL_PATH, max_workers=3, file_list="", threads=None, pin=False,
+        warmup_passes=1, page_timeout=PAGE_TIMEOUT, quarantine_path=QUARANTINE_PATH):
+    """
+    Runs inference with `max_workers` processes of `threads` torch/OpenCV
+    threads each (default: the CPUs split evenly between the workers),
+    optionally pinned to disjoint CPU sets.
+
+    A page taking longer than `page_timeout` seconds or crashing its worker
+    gets the worker replaced; pages that keep failing are skipped and the
+    run goes on with the rest. Every run writes its summary, with the
+    skipped pages, to `quarantine_path`.
+    """
+    # Create output directory if it doesn't exist
+    os.makedirs(json_dir, exist_ok=True)
+    threads = threads or default_threads(max_workers)
     print_flush("getting files\n")
-    files = os.listdir(IMG_DIR)
-    count = len(files)
-    with ProcessPoolExecutor(max_workers=3) as executor:
-        futures = [
-            executor.submit(
-                proc, IMG_DIR, img_filename, JSON_OUTPUT_DIR, i, count
-            )
-            for i, img_filename in enumerate(files)
-        ]
\ No newline at end of file
+    files = get_input_files(img_dir, file_list)
+    sets = cpu_sets(max_workers, threads) if pin else None
+    if pin and sets is None:
+        print(f"not pinning: {max_workers} workers x {threads} threads needs more than {len(available_cpus())} CPUs")
+    init_args = [
+        (model_path, threads, sets[slot] if sets else None, warmup_passes)
+        for slot in range(max_workers)
+    ]
+
+    def on_done(img_filename, done, total):
+        print_flush(f"processed image {done}/{total}: {img_filename}")
+
+    summary = run_pages(
+        [(fn, (img_dir, fn, json_dir)) for fn in files],
+        proc,
+        workers=max_workers,
+        init=init_worker,
+        init_args=init_args,
+        page_timeout=page_timeout,
+        on_done=on_done,
+    )
+    # written on every run so a report of an earlier run doesn't linger
+    write_quarantine_report(summary, quarantine_path)
+    if summary["quarantined"]:
+        print_flush(
+            f"{len(summary['quarantined'])}/{len(files)} pages failed, "
+            f"{summary['restarts']} worker restarts, see {quarantine_path}"
+        )
+    return summary
+
+
+if __name__ == "__main__":
+    run(IMG_DIR, JSON_OUTPUT_DIR)
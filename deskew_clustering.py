@@ -1,7 +1,8 @@
 import numpy as np
 import os
+import re
+import time
 import cv2
-from sklearn.cluster import DBSCAN
 
 # type alias
 CV_Img = cv2.typing.MatLike
@@ -29,6 +30,8 @@ def get_mean_deviation(
     elif len(angles) == 0:
         # if nothing, no rotation
         return 0
+    # imported here, scikit-learn is slow to import and only needed for clustering
+    from sklearn.cluster import DBSCAN
     data = np.array(angles).reshape(-1, 1)
     if DEBUG:
         print(f"reshaped: {data}")
@@ -89,6 +92,9 @@ def get_skew_params(
     for contour in contours:
         rect = cv2.minAreaRect(contour)
         center, dims, angle = rect
+        # OpenCV 4.5+ reports angles in (0, 90], older and newer releases
+        # in [-90, 0); both describe the same rectangle modulo 90
+        angle = angle % 90 or 90.0
         rect_area = dims[0] * dims[1]
         center = int32_list(center)
         if rect_area >= img_area * 0.01:
@@ -125,13 +131,7 @@ def deskew(
     # TODO: way to find optimum angle
     angle = get_mean_deviation(angles, contour_bbox_area, False)
     if DEBUG: print(f"rotating by {angle}")
-    if (angle == 0):
-        deskewed = original
-    else:
-        m = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1)
-        deskewed = cv2.warpAffine(
-            deskewed, m, (width, height), borderValue=(255, 255, 255)
-        )
+    deskewed = rotate(original, angle)
     return (
         deskewed,
         bbox_props,
@@ -139,6 +139,165 @@ def deskew(
     )
 
 
+def rotate(
+    img: CV_Img,
+    angle: Angle,
+    border_value=(255, 255, 255)
+) -> CV_Img:
+    if angle == 0:
+        return img
+    height: int = img.shape[0]
+    width: int = img.shape[1]
+    m = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1)
+    return cv2.warpAffine(
+        img, m, (width, height), borderValue=border_value
+    )
+
+
+def projection_score(binary: CV_Img, angle: Angle) -> float:
+    """sharpness of the horizontal projection profile after rotating by
+    angle, highest when text lines are horizontal
+    """
+    rotated = rotate(binary, angle, border_value=0)
+    rows = rotated.sum(axis=1, dtype=np.float64)
+    return float(np.var(rows))
+
+
+def verify_angle(
+    original: CV_Img,
+    angle: Angle,
+    max_width: int = 600,
+    step: float = 0.5,
+    tolerance: float = 0.02,
+    peak_ratio: float = 1.5,
+) -> bool:
+    """cheap check that angle still deskews the page, on a downscaled copy
+
+    Accepts when the projection profile at angle is at least as sharp
+    (within tolerance) as at angle +- step, and peak_ratio times sharper
+    than at angle +- 4 * step. Blank pages are never accepted so they go
+    through full estimation.
+    """
+    # strided subsampling is nearly free compared to cv2.resize
+    stride = max(1, -(-original.shape[1] // max_width))
+    small = np.ascontiguousarray(original[::stride, ::stride])
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    binary = cv2.threshold(
+        gray, 0, 1, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU
+    )[1]
+    ink = binary.mean()
+    if ink < 0.005 or ink > 0.5:
+        return False
+    score = projection_score(binary, angle)
+    neighbours = max(
+        projection_score(binary, angle - step),
+        projection_score(binary, angle + step),
+    )
+    # a wrong prior sits on a flat, smeared profile, require a clear peak
+    far = max(
+        projection_score(binary, angle - 4 * step),
+        projection_score(binary, angle + 4 * step),
+    )
+    return score >= neighbours * (1 - tolerance) and score >= far * peak_ratio
+
+
+def directory_key(
+    file_path: str
+) -> str:
+    """groups pages by their parent directory, for inputs laid out as one
+    directory per document
+    """
+    return os.path.dirname(os.path.abspath(file_path))
+
+
+def regex_key(
+    pattern: str
+):
+    """key function grouping pages by a regex on the file name: the first
+    group if the pattern has one, else the whole match. Pages it doesn't
+    match are a group of their own, so they never share an angle.
+
+    e.g. regex_key(r"^(.*)_p\d+") puts report_p001.png and report_p002.png
+    in one group
+    """
+    compiled = re.compile(pattern)
+
+    def key(file_path: str) -> str:
+        match = compiled.search(os.path.basename(file_path))
+        if match is None:
+            return file_path
+        return match.group(1) if compiled.groups else match.group(0)
+    return key
+
+
+class SkewPropagator:
+    """opt-in deskew that reuses the angle of the previous page of the
+    same document when verify_angle accepts it, and falls back to the full
+    estimator in deskew() otherwise.
+
+    key maps an image path to its document: directory_key (the default)
+    or a regex_key. Grouping unrelated pages only costs time, every prior
+    is still verified, but then few pages take the fast path.
+    """
+
+    def __init__(self, key=directory_key, **verify_kwargs):
+        self.key = key
+        self.verify_kwargs = verify_kwargs
+        self.priors: dict[str, Angle] = {}
+        self.fast_pages = 0
+        self.full_pages = 0
+        self.rejected = 0
+        self.fast_time = 0.0
+        self.full_time = 0.0
+
+    def deskew(
+        self,
+        original: CV_Img,
+        file_name: str
+    ) -> tuple[CV_Img, Angle]:
+        key = self.key(file_name)
+        prior = self.priors.get(key)
+        if prior is not None:
+            start = time.perf_counter()
+            accepted = verify_angle(original, prior, **self.verify_kwargs)
+            if accepted:
+                deskewed = rotate(original, prior)
+                self.fast_pages += 1
+            else:
+                self.rejected += 1
+            # a rejected prior is overhead of the fast path, not estimation
+            self.fast_time += time.perf_counter() - start
+            if accepted:
+                return deskewed, prior
+
+        if not self.full_pages:
+            # warm up outside the timing, so the one-time import doesn't
+            # inflate the average full estimation
+            import sklearn.cluster
+        start = time.perf_counter()
+        deskewed, _, angle = deskew(original)
+        self.priors[key] = angle
+        self.full_pages += 1
+        self.full_time += time.perf_counter() - start
+        return deskewed, angle
+
+    def report(self) -> dict:
+        """pages that took the fast path and the estimated time saved,
+        assuming those pages would have cost the average full estimation.
+        fast_time_s includes verifying the priors that were rejected
+        """
+        avg_full = self.full_time / self.full_pages if self.full_pages else 0
+        return {
+            "documents": len(self.priors),
+            "fast_pages": self.fast_pages,
+            "full_pages": self.full_pages,
+            "rejected_priors": self.rejected,
+            "fast_time_s": round(self.fast_time, 3),
+            "full_time_s": round(self.full_time, 3),
+            "time_saved_s": round(self.fast_pages * avg_full - self.fast_time, 3),
+        }
+
+
 def annotate_skews(
     img: CV_Img,
     bbox_props: BBoxPropsList,
@@ -187,17 +346,31 @@ def deskew_image(
     Args:
         src_img_path (str): relative path of image
     """
+    return deskew_image_with_angle(src_img_path)[0]
+
+def deskew_image_with_angle(
+    src_img_path: str,
+    propagator: SkewPropagator | None = None
+) -> tuple[CV_Img, Angle]:
+    """deskews image and returns the rotation angle that was applied
+    Args:
+        src_img_path (str): relative path of image
+        propagator (SkewPropagator, optional): reuse angles across pages of a document. Defaults to None.
+    """
     src_img = cv2.imread(src_img_path)
     if src_img is None:
         raise FileNotFoundError(f"{src_img_path} not found")
 
-    return deskew(src_img)[0]
+    if propagator is not None:
+        return propagator.deskew(src_img, src_img_path)
+    deskewed, _, angle = deskew(src_img)
+    return deskewed, angle
 
 def deskew_and_write(
     src_img_path: str,
     save_annotated_img: bool = True,
     out_dir: str = "./out",
-    write_threshold: float = 0
+    write_threshold: float | None = 0
 ) -> CV_Img:
     """deskews image
 
@@ -205,7 +378,7 @@ def deskew_and_write(
         src_img_path (str): relative path of image
         out_dir (str, optional): output directory. Defaults to "out".
         save_annotated_img (bool, optional): whether to save annotated bboxs in image. Defaults to True.
-        write_threshold (float, optional): will only write if rotation angle is greater than this. Defaults to 0.
+        write_threshold (float, optional): will only write if the rotation angle, in either direction, is greater than this; None writes every image. Defaults to 0.
     """
     img_name = os.path.basename(src_img_path)
     out_path = os.path.join(out_dir, img_name)
@@ -215,7 +388,7 @@ def deskew_and_write(
         raise FileNotFoundError(f"{src_img_path} not found")
 
     deskewed, bbox_props, angle = deskew(src_img)
-    if angle > write_threshold:
+    if write_threshold is None or abs(angle) > write_threshold:
         cv2.imwrite(out_path, deskewed)
         if save_annotated_img:
             annoted_img = annotate_skews(
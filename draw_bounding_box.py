@@ -1,98 +1,312 @@
 import cv2
-import json
 import os
-import glob
+import html
+import struct
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from page_result import iter_pages, load_page
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp')
+
+# stable colors (BGR) for the output categories, see utils/expected_output.txt
+CATEGORY_COLORS = {
+    1: (255, 0, 0),    # Text
+    2: (0, 0, 255),    # Title
+    3: (255, 0, 255),  # List
+    4: (0, 255, 0),    # Table
+    5: (0, 255, 255),  # Figure
+}
+FALLBACK_COLORS = [
+    (255, 255, 0), (128, 0, 255), (0, 128, 255), (255, 128, 0)
+]
+
+
+def category_color(category_id):
+    """
+    Returns the same color for a category on every page, regardless of
+    which other categories appear on it.
+    """
+    if category_id in CATEGORY_COLORS:
+        return CATEGORY_COLORS[category_id]
+    if not isinstance(category_id, int):
+        return (255, 255, 255)
+    return FALLBACK_COLORS[category_id % len(FALLBACK_COLORS)]
+
+
+def draw_annotations(image, page, scale=1.0):
+    """
+    Draws the bounding boxes of a PageResult on the image in place,
+    multiplied by `scale` to match a resized image.
+    """
+    thickness = 2 if scale >= 0.5 else 1
+    font_scale = 0.7 * max(scale, 0.5)
+    boxes = page.boxes().scale(scale)
+    for (x1, y1, x2, y2), category_id in zip(boxes.xyxy.astype(int).tolist(), boxes.labels.tolist()):
+        color = category_color(category_id)
+
+        cv2.rectangle(image, (x1, y1), (x2, y2), color, thickness=thickness)
+        cv2.putText(image, f"Cat: {category_id}", (x1, y1 - 10 * thickness), cv2.FONT_HERSHEY_SIMPLEX, font_scale, color, thickness)
+    return image
+
 
 def draw_bounding_boxes(image_path, json_path, output_path):
     """
     Loads an image, draws colored bounding boxes on it based on a JSON
     file, and saves the result.
     """
-    
+
     image = cv2.imread(image_path)
     if image is None:
         print(f"    - Warning: Could not read image from '{image_path}'. Skipping.")
         return
 
     try:
-        with open(json_path, 'r') as f:
-            data = json.load(f)
+        page = load_page(json_path)
     except FileNotFoundError:
         print(f"    - Warning: JSON file not found at '{json_path}'. Skipping.")
         return
-    except json.JSONDecodeError:
+    except (ValueError, KeyError, TypeError):
         print(f"    - Warning: Could not decode JSON from '{json_path}'. Skipping.")
         return
 
-    colors = [
-        (255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 0),
-        (255, 0, 255), (0, 255, 255)
-    ]
-
-    annotations = data.get("annotations")
-    if not annotations:
+    if not len(page):
         print(f"    - Info: No annotations found in {json_path}. Saving original image.")
         cv2.imwrite(output_path, image)
         return
-        
-    unique_categories = sorted(list(set(ann.get('category_id', -1) for ann in annotations)))
-    category_colors = {cat_id: colors[i % len(colors)] for i, cat_id in enumerate(unique_categories)}
 
-    for annotation in annotations:
-        bbox = annotation.get('bbox')
-        category_id = annotation.get('category_id')
+    draw_annotations(image, page)
+    cv2.imwrite(output_path, image)
+
 
-        if bbox is None or category_id is None:
-            continue
+# JPEG start-of-frame markers, the ones carrying the image size
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def png_size(image_path):
+    """
+    Reads (width, height) from the PNG header without decoding the image.
+    Returns None for anything that is not a PNG.
+    """
+    try:
+        with open(image_path, 'rb') as f:
+            header = f.read(24)
+    except OSError:
+        return None
+    if len(header) < 24 or header[:8] != b'\x89PNG\r\n\x1a\n':
+        return None
+    return struct.unpack('>II', header[16:24])
 
-        color = category_colors.get(category_id, (255, 255, 255)) # Default to white
-        x, y, w, h = map(int, bbox)
-        
-        cv2.rectangle(image, (x, y), (x + w, y + h), color, thickness=2)
-        cv2.putText(image, f"Cat: {category_id}", (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
 
+def jpeg_size(image_path):
+    """
+    Reads (width, height) from the start-of-frame marker of a JPEG without
+    decoding the image. Returns None for anything that is not a JPEG.
+    """
+    try:
+        with open(image_path, 'rb') as f:
+            if f.read(2) != b'\xff\xd8':
+                return None
+            while True:
+                marker = f.read(2)
+                if len(marker) < 2 or marker[0] != 0xFF:
+                    return None
+                if marker[1] == 0xFF:
+                    # fill byte, the marker code follows
+                    f.seek(-1, 1)
+                    continue
+                if marker[1] in (0xD8, 0x01) or 0xD0 <= marker[1] <= 0xD7:
+                    continue  # markers without a length
+                length = f.read(2)
+                if len(length) < 2:
+                    return None
+                if marker[1] in JPEG_SOF_MARKERS:
+                    frame = f.read(5)
+                    if len(frame) < 5:
+                        return None
+                    height, width = struct.unpack('>HH', frame[1:5])
+                    return width, height
+                f.seek(struct.unpack('>H', length)[0] - 2, 1)
+    except OSError:
+        return None
+
+
+def image_size(image_path):
+    return png_size(image_path) or jpeg_size(image_path)
+
+
+def read_thumbnail(image_path, thumb_width):
+    """
+    Decodes an image at roughly `thumb_width` pixels wide.
+
+    When the original size is known from a PNG or JPEG header, OpenCV is
+    asked for a 1/2, 1/4 or 1/8 reduced decode. For JPEG, libjpeg scales
+    while decoding, which is several times cheaper than a full decode; for
+    PNG OpenCV still decodes the full page and only the resize is saved.
+
+    Returns (image, scale) where scale maps original coordinates to the
+    thumbnail, or (None, 0) if the image can't be read.
+    """
+    if thumb_width is None:
+        image = cv2.imread(image_path)
+        return (image, 1.0) if image is not None else (None, 0)
+
+    size = image_size(image_path)
+    flag, factor = cv2.IMREAD_COLOR, 1
+    if size is not None:
+        for reduced_flag, reduced_factor in (
+            (cv2.IMREAD_REDUCED_COLOR_8, 8),
+            (cv2.IMREAD_REDUCED_COLOR_4, 4),
+            (cv2.IMREAD_REDUCED_COLOR_2, 2),
+        ):
+            if size[0] / reduced_factor >= thumb_width:
+                flag, factor = reduced_flag, reduced_factor
+                break
+
+    image = cv2.imread(image_path, flag)
+    if image is None:
+        return None, 0
+    orig_width = size[0] if size is not None else image.shape[1] * factor
+
+    if image.shape[1] > thumb_width:
+        thumb_height = max(1, round(image.shape[0] * thumb_width / image.shape[1]))
+        image = cv2.resize(image, (thumb_width, thumb_height), interpolation=cv2.INTER_AREA)
+    return image, image.shape[1] / orig_width
+
+
+def render_page(image_path, page, output_path, thumb_width=480):
+    """
+    Renders the annotations of one PageResult onto a (downscaled) copy of
+    its image. Runs inside the worker processes of `render_batch`.
+
+    Returns a (status, number of annotations) tuple.
+    """
+    image, scale = read_thumbnail(image_path, thumb_width)
+    if image is None:
+        return "unreadable", 0
+    draw_annotations(image, page, scale)
     cv2.imwrite(output_path, image)
+    return "ok", len(page)
 
 
-def process_directories(image_dir, json_dir, output_dir):
+def find_images(image_dir):
     """
-    Processes all PNG/JSON pairs from separate input directories and saves the
-    results to an output directory.
+    Maps image base names (without extension) to their paths.
     """
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-        print(f"Created output directory: {output_dir}")
+    images = {}
+    for entry in os.listdir(image_dir):
+        base_name, ext = os.path.splitext(entry)
+        if ext.lower() in IMAGE_EXTENSIONS:
+            images[base_name] = os.path.join(image_dir, entry)
+    return images
 
-    search_paths = glob.glob(os.path.join(image_dir, '*.png'))
-    search_paths.extend(glob.glob(os.path.join(image_dir, '*.PNG')))
-    
-    if not search_paths:
-        print(f"Error: No .png files found in the directory '{image_dir}'.")
-        return
 
-    print(f"\nFound {len(search_paths)} PNG images. Starting processing...")
+def write_index(output_dir, rendered, thumb_width):
+    """
+    Writes an index.html contact sheet showing every rendered page of the
+    batch, with empty and unreadable pages listed first.
+    """
+    legend = " ".join(
+        f'<span style="color:rgb{color[::-1]}">&#9632; {cat_id}</span>'
+        for cat_id, color in CATEGORY_COLORS.items()
+    )
+    rendered = sorted(rendered, key=lambda r: (r[2] != "unreadable", r[3] != 0, r[0]))
+    cells = []
+    for base_name, out_name, status, count in rendered:
+        label = html.escape(base_name)
+        if status != "ok":
+            cells.append(f'<div class="cell bad"><p>{label}<br>{html.escape(status)}</p></div>')
+            continue
+        cells.append(
+            f'<div class="cell{" empty" if count == 0 else ""}">'
+            f'<a href="{html.escape(out_name)}"><img src="{html.escape(out_name)}" loading="lazy"></a>'
+            f'<p>{label} ({count})</p></div>'
+        )
+    width = thumb_width or 480
+    index_path = os.path.join(output_dir, 'index.html')
+    with open(index_path, 'w') as f:
+        f.write(f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Layout review</title>
+<style>
+body {{ font-family: sans-serif; }}
+.cell {{ display: inline-block; vertical-align: top; margin: 4px; width: {width}px; }}
+.cell img {{ max-width: 100%; border: 1px solid #ccc; }}
+.cell p {{ margin: 2px 0; font-size: 12px; word-break: break-all; }}
+.empty img {{ border-color: orange; }}
+.bad {{ background: #fdd; }}
+</style></head><body>
+<p>{len(rendered)} pages &mdash; {legend}</p>
+{"".join(cells)}
+</body></html>
+""")
+    return index_path
+
+
+def render_batch(image_dir, json_source, output_dir, thumb_width=480, max_workers=None, window=None, suffix='_annotated.png', index=True):
+    """
+    Renders all pages of a batch in parallel.
+
+    `json_source` can be a directory of per-file JSONs or a consolidated
+    .json/.jsonl file (see `page_result.iter_pages`). Pages are rendered
+    onto thumbnails `thumb_width` pixels wide, pass None to draw on the
+    full resolution image. At most `window` pages are in flight at once so
+    memory stays bounded on large batches.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    images = find_images(image_dir)
+    if not images:
+        print(f"Error: No images found in the directory '{image_dir}'.")
+        return []
+
+    max_workers = max_workers or os.cpu_count() or 1
+    window = window or max_workers * 4
+    rendered = []
+
+    print(f"\nFound {len(images)} images. Starting processing...")
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        pending = {}
+
+        def collect(done):
+            for future in done:
+                base_name, out_name = pending.pop(future)
+                try:
+                    status, count = future.result()
+                except Exception as e:
+                    status, count = f"error: {e}", 0
+                rendered.append((base_name, out_name, status, count))
 
-    for image_path in search_paths:
-        base_name = os.path.splitext(os.path.basename(image_path))[0]
-        
-        json_path = os.path.join(json_dir, base_name + '.json')
-    
-        output_image_path = os.path.join(output_dir, base_name + '_annotated.png')
+        for page in iter_pages(json_source):
+            base_name = os.path.splitext(page.file_name or "")[0]
+            image_path = images.get(base_name)
+            if image_path is None:
+                print(f"  - Warning: Skipping. No matching image found for {base_name}")
+                continue
+            out_name = base_name + suffix
+            future = executor.submit(
+                render_page, image_path, page, os.path.join(output_dir, out_name), thumb_width
+            )
+            pending[future] = (base_name, out_name)
+            if len(pending) >= window:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+        collect(pending.copy())
 
-        print(f"\nProcessing: {base_name}.png")
+    if index:
+        index_path = write_index(output_dir, rendered, thumb_width)
+        print(f"  -> Index written to: {index_path}")
+    print(f"\n✅ Batch processing complete! Rendered {len(rendered)} pages.")
+    return rendered
 
-        if os.path.exists(json_path):
-            draw_bounding_boxes(image_path, json_path, output_image_path)
-            print(f"  -> Saved to: {output_image_path}")
-        else:
-            print(f"  - Warning: Skipping. No matching JSON file found for {os.path.basename(image_path)}")
 
-    print("\n✅ Batch processing complete!")
+def process_directories(image_dir, json_dir, output_dir):
+    """
+    Processes all image/JSON pairs from separate input directories and saves
+    the full resolution results to an output directory.
+    """
+    return render_batch(image_dir, json_dir, output_dir, thumb_width=None, index=False)
 
 if __name__ == '__main__':
     images_directory = ''
-    json_directory = ''
+    json_directory = '' # directory of per-file JSONs or a consolidated .json/.jsonl
 
     output_directory = './test_output'
 
-    process_directories(images_directory, json_directory, output_directory)
+    render_batch(images_directory, json_directory, output_directory)
@@ -1,6 +1,5 @@
 import cv2
 import numpy as np
-from deskew import determine_skew
 import os
 import shutil
 
@@ -17,6 +16,9 @@ def deskew(src_img_path):
     if image is None:
         raise cv2.error(f"Could not read image file: {src_img_path}")
 
+    # imported here, the deskew package pulls in scikit-image
+    from deskew import determine_skew
+
     grayscale = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     angle = determine_skew(grayscale)
 
@@ -40,46 +42,55 @@ def deskew(src_img_path):
 
 
 
-directory = "" # specify your input image directory here
-out_dir = "deskewed_output" # specify your output directory here
+def deskew_directory(directory, out_dir):
+    """
+    Deskews every file in `directory` into `out_dir`. Files that fail are
+    copied over unchanged.
+    """
+    os.makedirs(out_dir, exist_ok=True)
 
-os.makedirs(out_dir, exist_ok=True)
+    try:
+        entries = os.listdir(directory)
+    except FileNotFoundError:
+        print(f"[FATAL ERROR] Input directory not found: {directory}")
+        return
 
-try:
-    entries = os.listdir(directory)
-except FileNotFoundError:
-    print(f"[FATAL ERROR] Input directory not found: {directory}")
-    exit()
+    files = [
+        entry
+        for entry in entries
+        if os.path.isfile(os.path.join(directory, entry))
+    ]
 
-files = [
-    entry
-    for entry in entries
-    if os.path.isfile(os.path.join(directory, entry))
-]
+    print(f"Found {len(files)} files to process. Output directory: {out_dir}\n")
 
-print(f"Found {len(files)} files to process. Output directory: {out_dir}\n")
+    for file in files:
+        src_path = os.path.join(directory, file)
+        dest_path = os.path.join(out_dir, file)
 
-for file in files:
-    src_path = os.path.join(directory, file)
-    dest_path = os.path.join(out_dir, file)
+        try:
+            print(f"Processing: {file}")
 
-    try:
-        print(f"Processing: {file}")
+            processed_image = deskew(src_path)
 
-        processed_image = deskew(src_path)
+            cv2.imwrite(dest_path, processed_image)
+            print(f"   -> Successfully saved to: {dest_path}")
 
-        cv2.imwrite(dest_path, processed_image)
-        print(f"   -> Successfully saved to: {dest_path}")
+        except Exception as e:
+            print(f"[ERROR] Failed to process {file}: {e}")
+            print(f"   -> Copying original (unskewed) file to: {dest_path}")
 
-    except Exception as e:
-        print(f"[ERROR] Failed to process {file}: {e}")
-        print(f"   -> Copying original (unskewed) file to: {dest_path}")
+            try:
+                shutil.copy(src_path, dest_path)
+            except Exception as copy_e:
+                print(f"[FATAL] Could not copy file {src_path}: {copy_e}")
+
+        print("---")
+
+    print("\nBatch processing complete.")
 
-        try:
-            shutil.copy(src_path, dest_path)
-        except Exception as copy_e:
-            print(f"[FATAL] Could not copy file {src_path}: {copy_e}")
 
-    print("---")
+if __name__ == "__main__":
+    directory = "" # specify your input image directory here
+    out_dir = "deskewed_output" # specify your output directory here
 
-print("\nBatch processing complete.")
+    deskew_directory(directory, out_dir)
@@ -2,11 +2,19 @@ import os
 import json
 import sys
 import time
-from doclayout_yolo import YOLOv10
 import deskew_clustering
+from boxes import Boxes, merge_overlapping, reading_order
+from page_result import PageResult
+from batch_runner import write_quarantine_report
 
 INPUT_DIR = "" # specify your input image directory here
+FILE_LIST = "" # optional re-queue list from utils/check_empty.py, one file name per line
 JSON_OUTPUT_DIR = "output_json/"
+MODEL_PATH = "models/docLayout.pt"
+PROPAGATE_SKEW = False # reuse the deskew angle across pages of the same document
+GROUP_REGEX = "" # regex on the file name whose first group names the document, e.g. r"^(.*)_p\d+"
+                 # without one the whole input directory is treated as one document
+QUARANTINE_PATH = "quarantine.json" # report of the pages that failed
 
 category_mapping = {
     0: {"id": 2, "name": "Title"},
@@ -21,12 +29,24 @@ category_mapping = {
     9: {"id": 1, "name": "Text"}
 }
 
+# boxes of the same output category overlapping more than this are merged
+MERGE_IOU = 0.7
+MERGE_CONTAINMENT = 0.95
+
 def print_flush(x):
     print(x)
     sys.stdout.flush()
 
-def process(img_filename, img_path, model, json_dir):
-    deskewed_image = deskew_clustering.deskew_image(img_path)
+def process(img_filename, img_path, model, json_dir, propagator=None):
+    deskewed_image, angle = deskew_clustering.deskew_image_with_angle(img_path, propagator)
+    detect_and_save(img_filename, deskewed_image, angle, model, json_dir)
+
+
+def detect_and_save(img_filename, deskewed_image, angle, model, json_dir):
+    save_json_file(detect(img_filename, deskewed_image, angle, model), json_dir)
+
+
+def detect(img_filename, deskewed_image, angle, model):
     det_res = model.predict(
         deskewed_image,
         imgsz=1024,
@@ -34,38 +54,51 @@ def process(img_filename, img_path, model, json_dir):
         device="cpu",
         verbose=False
     )
-    annotations = []
     results = det_res[0]
+    xyxy, labels, scores = [], [], []
     for box in results.boxes:
         original_category_id = int(box.cls[0])
 
         if category_mapping[original_category_id]["id"] is None:
             continue
 
-        x1, y1, x2, y2 = box.xyxy[0].tolist()
-        bbox = [
-            round(x1, 2),
-            round(y1, 2),
-            round(x2 - x1, 2),
-            round(y2 - y1, 2)
-        ]
-
-        new_category = category_mapping[original_category_id]
-        new_category_id = new_category["id"]
-        new_category_name = new_category["name"]
-
-        annotations.append({
-            "bbox": bbox,
-            "category_id": new_category_id,
-            "category_name": new_category_name
-        })
-    save_json_file({
-        "file_name": img_filename,
-        "annotations": annotations
-    }, json_dir)
-
-
-def save_json_file(data, out_path):
+        xyxy.append(box.xyxy[0].tolist())
+        labels.append(category_mapping[original_category_id]["id"])
+        scores.append(float(box.conf[0]))
+
+    # several model classes map to "Text", merge their duplicate boxes
+    # and emit the regions in reading order
+    boxes, _ = merge_overlapping(Boxes(xyxy, labels, scores), MERGE_IOU, MERGE_CONTAINMENT)
+    order = reading_order(boxes, deskewed_image.shape[1])
+    return PageResult.from_boxes(
+        img_filename,
+        boxes[order],
+        width=deskewed_image.shape[1],
+        height=deskewed_image.shape[0],
+        deskew_angle=round(float(angle), 2),
+    )
+
+
+def get_input_files(input_dir, file_list=""):
+    """
+    Returns the image files to process. If `file_list` is given, only the
+    files named in it (one per line, with or without extension) are
+    returned, which lets a re-queue list be fed straight back in.
+    """
+    files = os.listdir(input_dir)
+    if not file_list:
+        return files
+    with open(file_list, 'r') as f:
+        wanted = {
+            os.path.splitext(line.strip())[0]
+            for line in f
+            if line.strip()
+        }
+    return [fn for fn in files if os.path.splitext(fn)[0] in wanted]
+
+
+def save_json_file(page, out_path):
+    data = page.to_dict() if isinstance(page, PageResult) else page
     fn = os.path.splitext(data["file_name"])[0]
     output_json_path = os.path.join(out_path, fn + ".json")
     # print("saving file: "+ fn + ".json")
@@ -74,14 +107,53 @@ def save_json_file(data, out_path):
         json.dump(data, f, indent=2)
 
 
-if __name__ == "__main__":
-    # Initialize the YOLO model
-    model = YOLOv10("models/docLayout.pt")
+def load_model(model_path=MODEL_PATH):
+    # imported here so that importing this module doesn't pull in torch
+    from doclayout_yolo import YOLOv10
+    return YOLOv10(model_path)
+
+
+def run(input_dir, json_dir, model_path=MODEL_PATH, file_list="", propagate_skew=False, warmup_passes=1,
+        quarantine_path=QUARANTINE_PATH, group_regex=GROUP_REGEX, threads=None, pin=False):
+    """
+    Runs inference on every image in this process. A page that raises is
+    recorded and skipped instead of ending the run; every run writes its
+    summary, with the skipped pages, to `quarantine_path`. Use
+    concurrent_cpu_run to also bound the time a single page may take.
+
+    With `propagate_skew`, pages of one document reuse each other's deskew
+    angle. Documents are told apart by `group_regex` (see
+    deskew_clustering.regex_key); without it all of `input_dir` counts as
+    one document.
+
+    `threads` and `pin` set up this process the way concurrent_cpu_run
+    sets up each of its workers.
+    """
+    # Initialize the YOLO model and warm it up so the first image isn't
+    # timed cold
+    from worker_setup import available_cpus, cpu_sets, default_threads, setup_worker
+    threads = threads or default_threads(1)
+    cpus = None
+    if pin:
+        cpus = cpu_sets(1, threads)
+        if cpus is None:
+            print_flush(f"not pinning: {threads} threads needs more than {len(available_cpus())} CPUs")
+        else:
+            cpus = cpus[0]
+    model = setup_worker(model_path, threads, cpus, warmup_passes)
     print_flush("getting files\n")
-    files = os.listdir(INPUT_DIR)
+    files = get_input_files(input_dir, file_list)
+    propagator = None
+    if propagate_skew:
+        # pages of one document have to be adjacent to share their angle
+        files.sort()
+        propagator = deskew_clustering.SkewPropagator(
+            deskew_clustering.regex_key(group_regex) if group_regex else deskew_clustering.directory_key
+        )
     count = len(files)
     # Create output directory if it doesn't exist
-    os.makedirs(JSON_OUTPUT_DIR, exist_ok=True)
+    os.makedirs(json_dir, exist_ok=True)
+    quarantined = []
     start = time.perf_counter()
     for i, img_filename in enumerate(files):
         now = time.perf_counter() - start
@@ -92,7 +164,31 @@ time per img: {now/(i+1)*1000:.0f} ms
 ETA         : {(eta - eta%60)/60:2.0f}m:{eta%60:2.0f}s
 
 processing image: {img_filename}  {i+1}/{count}""")
-        img_path = os.path.join(INPUT_DIR, img_filename)
-        process(img_filename, img_path, model, JSON_OUTPUT_DIR)
+        img_path = os.path.join(input_dir, img_filename)
+        try:
+            process(img_filename, img_path, model, json_dir, propagator)
+        except Exception as e:
+            quarantined.append({
+                "key": img_filename,
+                "reason": "error",
+                "attempts": 1,
+                "error": f"{type(e).__name__}: {e}",
+            })
         sys.stdout.write("\033[5A")  # move cursor up 5 lines
         sys.stdout.write("\033[J")   # clear from cursor to end of screen
+    summary = {"done": count - len(quarantined), "quarantined": quarantined, "restarts": 0}
+    # written on every run so a report of an earlier run doesn't linger
+    write_quarantine_report(summary, quarantine_path)
+    if quarantined:
+        print_flush(f"{len(quarantined)}/{count} pages failed, see {quarantine_path}")
+    if propagator is not None:
+        report = propagator.report()
+        print_flush(
+            f"skew propagation: {report['fast_pages']}/{count} pages in {report['documents']} documents took the fast path, "
+            f"saved ~{report['time_saved_s']:.1f}s"
+        )
+    return summary
+
+
+if __name__ == "__main__":
+    run(INPUT_DIR, JSON_OUTPUT_DIR, MODEL_PATH, FILE_LIST, PROPAGATE_SKEW, group_regex=GROUP_REGEX)
@@ -0,0 +1,8 @@
+"""
+Command line entry point for the layout pipeline.
+
+    python -m layout_cli {infer,deskew,draw,eval,check,tune} ...
+
+Subcommands import their heavy dependencies (torch, OpenCV, scikit-learn)
+only when they run, so `--help` and light subcommands start fast.
+"""
@@ -0,0 +1,5 @@
+import sys
+from layout_cli.cli import main
+
+if __name__ == "__main__":
+    sys.exit(main())
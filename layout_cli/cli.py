@@ -0,0 +1,204 @@
+import argparse
+import os
+import sys
+
+# the pipeline modules live at the repository root
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+# Only stdlib may be imported at module level here. Every handler imports
+# what it needs, test_code/startup_importtime.py checks this stays true.
+
+DEFAULT_MODEL_PATH = "models/docLayout.pt"
+
+
+def cmd_infer(args):
+    if args.fetch_concurrency or args.deskew_workers:
+        ignored = [
+            flag for flag, value in (
+                ("--config", args.config), ("--threads", args.threads),
+                ("--pin", args.pin), ("--warmup", args.warmup is not None),
+                ("--page-timeout", args.page_timeout is not None),
+            ) if value
+        ]
+        if ignored:
+            mode = "--fetch-concurrency" if args.fetch_concurrency else "--deskew-workers"
+            print(f"{', '.join(ignored)} can't be combined with {mode}", file=sys.stderr)
+            return 2
+    if args.fetch_concurrency:
+        import async_ingest
+        summary = async_ingest.run(
+            args.input_dir, args.out, args.model, args.fetch_concurrency, args.files_from,
+            args.quarantine,
+        )
+        return 1 if summary["quarantined"] else 0
+    elif args.deskew_workers:
+        import shm_transport
+        summary = shm_transport.run_pipeline(
+            args.input_dir, args.out, args.model, args.deskew_workers, args.files_from,
+            args.quarantine,
+        )
+        return 1 if summary["quarantined"] else 0
+    workers, threads, pin = args.workers, args.threads, args.pin
+    warmup = 1 if args.warmup is None else args.warmup
+    page_timeout = 120.0 if args.page_timeout is None else args.page_timeout
+    if args.config:
+        import worker_setup
+        workers, threads, tuned_pin = worker_setup.load_config(args.config)
+        pin = pin or tuned_pin
+    if workers > 1:
+        import concurrent_cpu_run
+        summary = concurrent_cpu_run.run(
+            args.input_dir, args.out, args.model, workers, args.files_from,
+            threads, pin, warmup, page_timeout, args.quarantine,
+        )
+    else:
+        import inference
+        summary = inference.run(
+            args.input_dir, args.out, args.model, args.files_from,
+            args.propagate_skew, warmup, args.quarantine,
+            group_regex=args.group_regex, threads=threads, pin=pin,
+        )
+    return 1 if summary["quarantined"] else 0
+
+
+def cmd_tune(args):
+    import worker_setup
+    worker_setup.autotune(
+        args.input_dir, args.model, args.out, args.sample, args.pin
+    )
+    return 0
+
+
+def cmd_deskew(args):
+    if args.method == "hough":
+        import hough_deskew
+        hough_deskew.deskew_directory(args.input_dir, args.out)
+        return 0
+
+    import shutil
+    import deskew_clustering
+    os.makedirs(args.out, exist_ok=True)
+    for entry in sorted(os.listdir(args.input_dir)):
+        src_path = os.path.join(args.input_dir, entry)
+        if not os.path.isfile(src_path):
+            continue
+        print(f"Processing: {entry}")
+        try:
+            deskew_clustering.deskew_and_write(
+                src_path, args.annotate, args.out, args.write_threshold
+            )
+        except Exception as e:
+            # same as hough_deskew.deskew_directory: keep the original
+            print(f"[ERROR] Failed to process {entry}: {e}")
+            try:
+                shutil.copy(src_path, os.path.join(args.out, entry))
+            except OSError as copy_e:
+                print(f"[FATAL] Could not copy file {src_path}: {copy_e}")
+    return 0
+
+
+def cmd_draw(args):
+    import draw_bounding_box
+    thumb_width = None if args.full_size else args.thumb_width
+    draw_bounding_box.render_batch(
+        args.image_dir,
+        args.json_source,
+        args.out,
+        thumb_width=thumb_width,
+        max_workers=args.workers,
+        index=not args.no_index,
+    )
+    return 0
+
+
+def cmd_eval(args):
+    from utils import map_calculate
+    result = map_calculate.run_map_calculation(
+        args.predictions, args.ground_truth, args.iou
+    )
+    return 0 if result is not None else 1
+
+
+def cmd_check(args):
+    from utils import check_empty
+    check_empty.main(args.check_args)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="layout_cli",
+        description="Document layout analysis pipeline.",
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("infer", help="deskew images and run layout detection")
+    p.add_argument("input_dir")
+    p.add_argument("--out", default="output_json/", help="directory for the per-file JSONs")
+    p.add_argument("--model", default=DEFAULT_MODEL_PATH)
+    p.add_argument("--workers", type=int, default=1, help="number of worker processes")
+    p.add_argument("--files-from", default="", help="only process the files named in this re-queue list")
+    p.add_argument("--deskew-workers", type=int, default=0, help="deskew in this many processes and pass pages to inference through shared memory")
+    p.add_argument("--fetch-concurrency", type=int, default=0, help="fetch and decode this many pages concurrently with asyncio, for slow input mounts")
+    p.add_argument("--propagate-skew", action="store_true", help="reuse the deskew angle of the previous page of the same document when a quick check confirms it (single process only); without --group-regex the whole input directory is one document")
+    p.add_argument("--group-regex", default="", help="with --propagate-skew: regex on the file name whose first group names the document, e.g. '^(.*)_p\\d+'")
+    p.add_argument("--threads", type=int, default=None, help="torch/OpenCV threads per worker (default: CPUs / workers)")
+    p.add_argument("--pin", action="store_true", help="pin workers to disjoint CPU sets")
+    p.add_argument("--warmup", type=int, default=None, help="warmup predictions per worker before timing (default: 1)")
+    p.add_argument("--config", default="", help="read workers and threads from a 'tune' output file")
+    p.add_argument("--page-timeout", type=float, default=None, help="seconds a page may take before its worker is restarted (--workers > 1, default: 120)")
+    p.add_argument("--quarantine", default="quarantine.json", help="report of the pages that failed or timed out")
+    p.set_defaults(func=cmd_infer)
+
+    p = sub.add_parser("tune", help="find the fastest workers x threads split on this machine")
+    p.add_argument("input_dir", help="directory of sample images")
+    p.add_argument("--out", default="tune.json")
+    p.add_argument("--model", default=DEFAULT_MODEL_PATH)
+    p.add_argument("--sample", type=int, default=24, help="number of images per configuration")
+    p.add_argument("--pin", action="store_true", help="pin workers to disjoint CPU sets")
+    p.set_defaults(func=cmd_tune)
+
+    p = sub.add_parser("deskew", help="deskew a directory of images")
+    p.add_argument("input_dir")
+    p.add_argument("--out", default="./out")
+    p.add_argument("--method", choices=("clustering", "hough"), default="clustering")
+    p.add_argument("--annotate", action="store_true", help="also save images with the detected skew boxes (clustering only)")
+    p.add_argument("--write-threshold", type=float, default=None, help="only write images rotated by more than this many degrees, in either direction (clustering only; default: write every image)")
+    p.set_defaults(func=cmd_deskew)
+
+    p = sub.add_parser("draw", help="render annotations for visual review")
+    p.add_argument("image_dir")
+    p.add_argument("json_source", help="directory of per-file JSONs or a consolidated .json/.jsonl")
+    p.add_argument("--out", default="./test_output")
+    p.add_argument("--thumb-width", type=int, default=480)
+    p.add_argument("--full-size", action="store_true", help="draw on the full resolution images")
+    p.add_argument("--workers", type=int, default=None)
+    p.add_argument("--no-index", action="store_true", help="don't write index.html")
+    p.set_defaults(func=cmd_draw)
+
+    p = sub.add_parser("eval", help="compute mAP of predictions against ground truth")
+    p.add_argument("predictions")
+    p.add_argument("ground_truth")
+    p.add_argument("--iou", type=float, default=0.5)
+    p.set_defaults(func=cmd_eval)
+
+    p = sub.add_parser(
+        "check",
+        help="flag empty and anomalous outputs",
+        add_help=False,
+    )
+    # all arguments are forwarded to utils/check_empty.py
+    p.set_defaults(func=cmd_check)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args, extra = parser.parse_known_args(argv)
+    if args.command == "check":
+        args.check_args = extra
+    elif extra:
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    return args.func(args)
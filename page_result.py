@@ -0,0 +1,235 @@
+import glob
+import json
+import os
+import numpy as np
+from boxes import Boxes
+
+# output categories, see utils/expected_output.txt
+CATEGORY_NAMES = {
+    1: "Text",
+    2: "Title",
+    3: "List",
+    4: "Table",
+    5: "Figure",
+}
+
+# category ids are stored as int8
+CATEGORY_RANGE = (np.iinfo(np.int8).min, np.iinfo(np.int8).max)
+
+BBOX_DECIMALS = 2
+SCORE_DECIMALS = 3
+
+
+class PageResult:
+    """
+    Layout result of one page, backed by contiguous arrays instead of a
+    list of annotation dicts.
+
+    bboxes are [x, y, width, height] rows (float32, Nx4), category the
+    output category ids (int8) and score the confidences (float16), or
+    None for outputs written without scores. `from_dict` / `to_dict`
+    convert losslessly to and from the JSON written by inference.py, for
+    boxes rounded to 2 decimals and scores rounded to 3.
+    """
+
+    __slots__ = (
+        "file_name", "width", "height", "deskew_angle",
+        "bboxes", "category", "score", "category_names",
+    )
+
+    def __init__(self, file_name, bboxes=None, category=None, score=None,
+                 width=None, height=None, deskew_angle=None, category_names=None):
+        self.file_name = file_name
+        self.width = width
+        self.height = height
+        self.deskew_angle = deskew_angle
+        self.bboxes = np.asarray(
+            bboxes if bboxes is not None else (), dtype=np.float32
+        ).reshape(-1, 4)
+        self.category = np.asarray(
+            category if category is not None else (), dtype=np.int8
+        )
+        self.score = None if score is None else np.asarray(score, dtype=np.float16)
+        # only set when a page uses names that differ from CATEGORY_NAMES
+        self.category_names = category_names
+
+    def __len__(self):
+        return len(self.bboxes)
+
+    def __repr__(self):
+        return f"PageResult({self.file_name!r}, {len(self)} boxes)"
+
+    @classmethod
+    def from_dict(cls, data):
+        if not isinstance(data, dict):
+            raise ValueError(f"expected a page object, got {type(data).__name__}")
+        annotations = data.get("annotations") or []
+        bboxes = [ann["bbox"] for ann in annotations]
+        if any(len(bbox) != 4 for bbox in bboxes):
+            raise ValueError(f"{data.get('file_name')}: bbox without 4 values")
+        category = [ann["category_id"] for ann in annotations]
+        low, high = CATEGORY_RANGE
+        if any(not isinstance(cat, int) or not low <= cat <= high for cat in category):
+            raise ValueError(f"{data.get('file_name')}: category_id not an integer in {low}..{high}")
+        score = None
+        if annotations and all("score" in ann for ann in annotations):
+            score = [ann["score"] for ann in annotations]
+        names = [ann.get("category_name") for ann in annotations]
+        category_names = None
+        if any(name != CATEGORY_NAMES.get(cat) for name, cat in zip(names, category)):
+            category_names = tuple(names)
+        return cls(
+            data.get("file_name"),
+            bboxes,
+            category,
+            score,
+            data.get("width"),
+            data.get("height"),
+            data.get("deskew_angle"),
+            category_names,
+        )
+
+    @classmethod
+    def from_boxes(cls, file_name, boxes, **kwargs):
+        """
+        Builds a page from a boxes.Boxes (xyxy corners), rounding to the
+        precision written to JSON.
+        """
+        return cls(
+            file_name,
+            np.round(boxes.xywh, BBOX_DECIMALS),
+            boxes.labels,
+            np.round(boxes.scores, SCORE_DECIMALS),
+            **kwargs,
+        )
+
+    def to_dict(self):
+        data = {"file_name": self.file_name}
+        for key in ("width", "height", "deskew_angle"):
+            value = getattr(self, key)
+            if value is not None:
+                data[key] = value
+        bboxes = self.bboxes.tolist()
+        categories = self.category.tolist()
+        scores = self.score.tolist() if self.score is not None else None
+        annotations = []
+        for k, (bbox, category_id) in enumerate(zip(bboxes, categories)):
+            ann = {
+                "bbox": [round(v, BBOX_DECIMALS) for v in bbox],
+                "category_id": category_id,
+                "category_name": (
+                    self.category_names[k] if self.category_names is not None
+                    else CATEGORY_NAMES.get(category_id)
+                ),
+            }
+            if scores is not None:
+                ann["score"] = round(scores[k], SCORE_DECIMALS)
+            annotations.append(ann)
+        data["annotations"] = annotations
+        return data
+
+    @property
+    def xyxy(self):
+        xyxy = self.bboxes.astype(np.float64)
+        xyxy[:, 2:] += xyxy[:, :2]
+        return xyxy
+
+    def boxes(self):
+        return Boxes(self.xyxy, self.category, self.score)
+
+
+class PageBatch:
+    """
+    Many pages packed into one set of arrays, with `offsets[i]` to
+    `offsets[i + 1]` being the boxes of page i. Pages are materialised as
+    PageResult views on access. Non-standard category names are not kept.
+    """
+
+    __slots__ = (
+        "file_names", "width", "height", "deskew_angle",
+        "offsets", "bboxes", "category", "score",
+    )
+
+    def __init__(self, pages):
+        pages = list(pages)
+        counts = np.fromiter((len(p) for p in pages), dtype=np.int64, count=len(pages))
+        self.offsets = np.zeros(len(pages) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.offsets[1:])
+        self.file_names = [p.file_name for p in pages]
+        self.width = np.array([p.width or 0 for p in pages], dtype=np.int32)
+        self.height = np.array([p.height or 0 for p in pages], dtype=np.int32)
+        self.deskew_angle = np.array(
+            [np.nan if p.deskew_angle is None else p.deskew_angle for p in pages], dtype=np.float32
+        )
+        self.bboxes = np.concatenate([p.bboxes for p in pages]) if pages else np.zeros((0, 4), np.float32)
+        self.category = np.concatenate([p.category for p in pages]) if pages else np.zeros(0, np.int8)
+        self.score = np.concatenate([
+            p.score if p.score is not None else np.full(len(p), np.nan, np.float16)
+            for p in pages
+        ]) if pages else np.zeros(0, np.float16)
+
+    def __len__(self):
+        return len(self.file_names)
+
+    def __getitem__(self, i):
+        start, end = self.offsets[i], self.offsets[i + 1]
+        score = self.score[start:end]
+        angle = self.deskew_angle[i]
+        return PageResult(
+            self.file_names[i],
+            self.bboxes[start:end],
+            self.category[start:end],
+            None if np.isnan(score).any() else score,
+            int(self.width[i]) or None,
+            int(self.height[i]) or None,
+            None if np.isnan(angle) else round(float(angle), 2),
+        )
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def nbytes(self):
+        return sum(
+            getattr(self, name).nbytes
+            for name in ("width", "height", "deskew_angle", "offsets", "bboxes", "category", "score")
+        )
+
+
+def load_page(json_path):
+    with open(json_path, 'rb') as f:
+        return PageResult.from_dict(json.loads(f.read()))
+
+
+def iter_pages(json_source):
+    """
+    Yields PageResults from either a directory of per-file JSONs, a
+    consolidated JSON file holding a list of pages, or a JSON-lines file
+    with one page per line.
+    """
+    if os.path.isdir(json_source):
+        for json_path in sorted(glob.glob(os.path.join(json_source, '*.json'))):
+            try:
+                yield load_page(json_path)
+            except (ValueError, KeyError, TypeError):
+                print(f"    - Warning: Could not decode JSON from '{json_path}'. Skipping.")
+        return
+
+    with open(json_source, 'r') as f:
+        if json_source.endswith('.jsonl'):
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield PageResult.from_dict(json.loads(line))
+                except (ValueError, KeyError, TypeError):
+                    print(f"    - Warning: Could not decode line {line_no} of '{json_source}'. Skipping.")
+            return
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = [data]
+    for i, page in enumerate(data):
+        try:
+            yield PageResult.from_dict(page)
+        except (ValueError, KeyError, TypeError):
+            print(f"    - Warning: Could not decode page {i} of '{json_source}'. Skipping.")
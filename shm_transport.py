@@ -0,0 +1,313 @@
+import os
+import queue
+import time
+from contextlib import closing
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from batch_runner import write_quarantine_report
+
+QUARANTINE_PATH = "quarantine.json"  # report of the pages that failed
+
+# largest page a slot holds without falling back to pickling,
+# A4 at 400 dpi in BGR
+DEFAULT_SLOT_BYTES = 4680 * 3310 * 3
+# how often a producer waiting for a free slot checks for a stop
+STOP_POLL_SECONDS = 0.1
+# seconds without any page arriving before iter_deskewed gives up on the
+# pages still in the workers, e.g. a deskew that hangs
+STALL_TIMEOUT = 120.0
+
+
+class RingStopped(Exception):
+    """
+    Raised to producers waiting on a ring whose consumer has stopped.
+    """
+
+
+class PageRing:
+    """
+    Ring of preallocated page slots in one shared memory block.
+
+    Ownership of a slot is handed around through two queues:
+    a producer takes a free slot index (`acquire`), writes a page into it
+    and hands it to the consumer (`publish`). The consumer gets a zero-copy
+    NumPy view of the slot (`receive`) and hands the slot back (`release`)
+    once it no longer uses the view. Only the current owner of a slot may
+    touch its memory.
+
+    The ring is created in the parent process and passed to workers through
+    a pool initializer or `Process` args, where it is re-attached by name.
+    Pages that don't fit in a slot are sent pickled through the queue.
+
+    A consumer that quits early calls `stop`, which makes producers blocked
+    in `acquire` raise RingStopped instead of waiting for a slot forever.
+    """
+
+    def __init__(self, n_slots, slot_bytes=DEFAULT_SLOT_BYTES, ctx=None):
+        ctx = ctx or mp.get_context()
+        self.n_slots = n_slots
+        self.slot_bytes = slot_bytes
+        self._shm = shared_memory.SharedMemory(create=True, size=n_slots * slot_bytes)
+        self._owner = True
+        self._free = ctx.Queue()
+        self._ready = ctx.Queue()
+        self._stop = ctx.Event()
+        for slot in range(n_slots):
+            self._free.put(slot)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_shm"] = self._shm.name
+        state["_owner"] = False
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._shm = shared_memory.SharedMemory(name=state["_shm"])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def view(self, slot, shape, dtype=np.uint8):
+        """
+        NumPy array backed directly by the memory of `slot`.
+        """
+        return np.ndarray(shape, dtype=dtype, buffer=self._shm.buf, offset=slot * self.slot_bytes)
+
+    def acquire(self, timeout=None):
+        """
+        Takes ownership of a free slot, blocking until one is released.
+        Raises RingStopped once the ring is stopped.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if self._stop.is_set():
+                raise RingStopped()
+            wait = STOP_POLL_SECONDS
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+                if wait <= 0:
+                    raise queue.Empty()
+            try:
+                return self._free.get(timeout=wait)
+            except queue.Empty:
+                continue
+
+    def stop(self):
+        """
+        Tells the producers that no more pages will be received.
+        """
+        self._stop.set()
+
+    def stopped(self):
+        return self._stop.is_set()
+
+    def drain(self):
+        """
+        Receives and releases every page published so far. Used after
+        `stop` so no producer is left blocked on a full queue.
+        """
+        while True:
+            try:
+                slot, _, _ = self.receive(timeout=STOP_POLL_SECONDS)
+            except queue.Empty:
+                return
+            self.release(slot)
+
+    def publish(self, slot, shape, dtype, meta):
+        """
+        Hands a written slot over to the consumer.
+        """
+        self._ready.put((slot, tuple(shape), np.dtype(dtype).str, meta))
+
+    def put(self, image, meta, timeout=None):
+        """
+        Copies `image` into a free slot and publishes it. Images larger than
+        a slot, and `meta`-only messages (image=None), go through the queue.
+        """
+        if image is None or image.nbytes > self.slot_bytes:
+            self._ready.put((None, image, None, meta))
+            return
+        slot = self.acquire(timeout)
+        np.copyto(self.view(slot, image.shape, image.dtype), image)
+        self.publish(slot, image.shape, image.dtype, meta)
+
+    def receive(self, timeout=None):
+        """
+        Takes ownership of the next published page.
+
+        Returns (slot, image, meta). `image` is a view into shared memory
+        that stays valid until `release(slot)`; slot is None for pages that
+        were sent through the queue.
+        """
+        slot, shape, dtype, meta = self._ready.get(timeout=timeout)
+        if slot is None:
+            return None, shape, meta
+        return slot, self.view(slot, shape, np.dtype(dtype)), meta
+
+    def release(self, slot):
+        """
+        Hands a slot back to the producers. Views of it must not be used
+        afterwards.
+        """
+        if slot is not None:
+            self._free.put(slot)
+
+    def close(self):
+        try:
+            self._shm.close()
+        except BufferError:
+            # a caller still holds a view, the mapping goes away with it
+            pass
+        if self._owner:
+            self._shm.unlink()
+
+
+# ring of the current worker process, set by init_worker
+_ring = None
+
+
+def init_worker(ring):
+    global _ring
+    _ring = ring
+
+
+def deskew_to_ring(img_path):
+    """
+    Reads and deskews one image in a worker and publishes it to the ring.
+    Errors are published as well so the consumer can count every page.
+    """
+    import deskew_clustering
+    if _ring.stopped():
+        return
+    meta = {"file_name": os.path.basename(img_path)}
+    try:
+        image, angle = deskew_clustering.deskew_image_with_angle(img_path)
+    except Exception as e:
+        meta["error"] = str(e)
+        _ring.put(None, meta)
+        return
+    meta["deskew_angle"] = angle
+    try:
+        _ring.put(image, meta)
+    except RingStopped:
+        pass
+
+
+def iter_deskewed(img_paths, workers=3, n_slots=None, slot_bytes=DEFAULT_SLOT_BYTES, stall_timeout=STALL_TIMEOUT):
+    """
+    Deskews `img_paths` in a pool of worker processes and yields
+    (image, meta) in completion order. `image` is a view into shared memory
+    that is only valid until the next iteration; copy it to keep it.
+
+    If the consumer stops early (an exception, or closing the generator),
+    queued pages are cancelled and the workers are stopped before the pool
+    is shut down. If no page arrives for `stall_timeout` seconds while
+    pages are outstanding, the workers are killed and TimeoutError is
+    raised; the pages not yielded yet are lost.
+    """
+    n_slots = n_slots or workers * 2
+    with PageRing(n_slots, slot_bytes) as ring, ProcessPoolExecutor(
+        max_workers=workers, initializer=init_worker, initargs=(ring,)
+    ) as executor:
+        futures = [executor.submit(deskew_to_ring, path) for path in img_paths]
+        received = 0
+        last_page = time.monotonic()
+        stalled = False
+        try:
+            while received < len(futures):
+                try:
+                    slot, image, meta = ring.receive(timeout=1)
+                except queue.Empty:
+                    crashed = [f for f in futures if f.done() and f.exception()]
+                    if crashed:
+                        raise crashed[0].exception()
+                    if time.monotonic() - last_page > stall_timeout:
+                        stalled = True
+                        raise TimeoutError(
+                            f"no page deskewed in {stall_timeout:.0f}s, "
+                            f"{len(futures) - received} pages outstanding"
+                        )
+                    continue
+                received += 1
+                try:
+                    yield image, meta
+                finally:
+                    del image
+                    ring.release(slot)
+                last_page = time.monotonic()
+        finally:
+            if received < len(futures):
+                ring.stop()
+                processes = list(executor._processes.values())
+                executor.shutdown(wait=False, cancel_futures=True)
+                if stalled:
+                    # a hung deskew never sees the stop and the pool can't
+                    # cancel a running task, so kill its processes
+                    for process in processes:
+                        process.kill()
+                # running producers either publish or see the stop, keep
+                # draining until they are all done
+                while not all(f.done() for f in futures):
+                    ring.drain()
+                ring.drain()
+
+
+def run_pipeline(input_dir, json_dir, model_path, deskew_workers=3, file_list="",
+                 quarantine_path=QUARANTINE_PATH):
+    """
+    Runs deskew in `deskew_workers` processes and inference in this one,
+    passing the deskewed pages through shared memory.
+
+    A page that fails to deskew or detect is recorded and skipped. If the
+    deskew workers stall (see iter_deskewed) the pages not done by then are
+    recorded as timed out. Every run writes its summary, like
+    batch_runner.run_pages returns it, to `quarantine_path` and returns it.
+    """
+    import inference
+    model = inference.load_model(model_path)
+    os.makedirs(json_dir, exist_ok=True)
+    files = inference.get_input_files(input_dir, file_list)
+    count = len(files)
+    start = time.perf_counter()
+    paths = [os.path.join(input_dir, fn) for fn in files]
+    quarantined = []
+    seen = set()
+    done = 0
+
+    def fail(name, reason, error):
+        quarantined.append({"key": name, "reason": reason, "attempts": 1, "error": error})
+        inference.print_flush(f"failed {name}: {error}")
+
+    try:
+        with closing(iter_deskewed(paths, deskew_workers)) as pages:
+            for i, (image, meta) in enumerate(pages):
+                name = meta["file_name"]
+                seen.add(name)
+                if "error" in meta:
+                    fail(name, "error", meta["error"])
+                    continue
+                try:
+                    inference.detect_and_save(name, image, meta["deskew_angle"], model, json_dir)
+                except Exception as e:
+                    fail(name, "error", f"{type(e).__name__}: {e}")
+                    continue
+                done += 1
+                now = time.perf_counter() - start
+                inference.print_flush(f"processed image {i+1}/{count} ({now/(i+1)*1000:.0f} ms per img)")
+    except TimeoutError as e:
+        inference.print_flush(str(e))
+        for name in files:
+            if name not in seen:
+                fail(name, "timeout", str(e))
+
+    summary = {"done": done, "quarantined": quarantined, "restarts": 0}
+    write_quarantine_report(summary, quarantine_path)
+    if quarantined:
+        inference.print_flush(f"{len(quarantined)}/{count} pages failed, see {quarantine_path}")
+    return summary
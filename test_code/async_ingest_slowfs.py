@@ -0,0 +1,79 @@
+"""
+Runs async_ingest.ingest against a directory source with injected read
+latency, standing in for a slow NFS mount, and checks that concurrent
+fetching hides the latency and that every page reaches the sink.
+
+    python test_code/async_ingest_slowfs.py [latency_ms] [pages]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import async_ingest
+
+
+class SlowDirectorySource(async_ingest.DirectorySource):
+    """
+    DirectorySource whose reads block for `latency` seconds first, the way
+    a slow mount blocks the reading thread.
+    """
+
+    def __init__(self, directory, latency, max_workers=16):
+        super().__init__(directory, max_workers)
+        self.latency = latency
+
+    def _read(self, name):
+        time.sleep(self.latency)
+        return super()._read(name)
+
+
+def make_pages(directory, count):
+    for i in range(count):
+        page = np.full((1100, 850, 3), 255, dtype=np.uint8)
+        cv2.putText(page, f"page {i}", (100, 200), cv2.FONT_HERSHEY_SIMPLEX, 3, (0, 0, 0), 5)
+        cv2.imwrite(os.path.join(directory, f"doc_{i:04d}.png"), page)
+    with open(os.path.join(directory, "corrupt.png"), 'wb') as f:
+        f.write(b"not a png")
+
+
+def stage(name, image):
+    time.sleep(0.005)  # stands in for deskew + inference
+    return image.shape
+
+
+def run(directory, latency, concurrency, names):
+    written = {}
+
+    async def sink(name, shape):
+        await asyncio.sleep(latency)  # slow output mount
+        written[name] = shape
+
+    source = SlowDirectorySource(directory, latency, max_workers=concurrency)
+    start = time.perf_counter()
+    errors = asyncio.run(
+        async_ingest.ingest(source, names, stage, sink, concurrency=concurrency, queue_size=4)
+    )
+    return time.perf_counter() - start, written, errors
+
+
+if __name__ == "__main__":
+    latency = (float(sys.argv[1]) if len(sys.argv) > 1 else 50) / 1000
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+
+    with tempfile.TemporaryDirectory() as directory:
+        make_pages(directory, count)
+        names = async_ingest.DirectorySource(directory).list()
+
+        serial, written, errors = run(directory, latency, 1, names)
+        assert len(written) == count and list(errors) == ["corrupt.png"], errors
+        print(f"concurrency  1: {serial:6.2f} s")
+
+        concurrent, written, errors = run(directory, latency, 16, names)
+        assert len(written) == count and list(errors) == ["corrupt.png"], errors
+        print(f"concurrency 16: {concurrent:6.2f} s ({serial / concurrent:.1f}x)")
+        assert concurrent < serial / 4, "concurrent fetching should hide read latency"
@@ -0,0 +1,114 @@
+"""
+Microbenchmarks for boxes.py on synthetic pages with many boxes, against
+the pairwise pure Python IoU used by utils/map_calculate.calculate_iou,
+and on a page mixing text lines with page-sized boxes.
+
+    python test_code/boxes_benchmark.py [boxes ...]
+"""
+import os
+import sys
+import time
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "utils"))
+import boxes
+from map_calculate import calculate_iou
+
+
+def synthetic_page(n, width=2480, height=3508, seed=0):
+    """
+    Two column page of text lines with ~10% near-duplicate boxes, the way
+    several model classes collapse onto "Text".
+    """
+    rng = np.random.default_rng(seed)
+    column = rng.integers(0, 2, n)
+    x = 100 + column * width / 2 + rng.uniform(0, 50, n)
+    y = rng.uniform(100, height - 200, n)
+    w = rng.uniform(300, width / 2 - 250, n)
+    h = rng.uniform(20, 120, n)
+    xywh = np.stack([x, y, w, h], axis=1)
+    dup = rng.random(n) < 0.1
+    xywh[dup] = xywh[rng.integers(0, n, dup.sum())] + rng.uniform(-3, 3, (dup.sum(), 4))
+    labels = rng.choice([1, 1, 1, 2, 4, 5], n)
+    return boxes.Boxes.from_xywh(xywh, labels, rng.random(n))
+
+
+def mixed_page(small=300, large=100, width=2480, height=3508, seed=0):
+    """
+    Text lines plus page-sized boxes (figures, tables, whole-page
+    detections), which a grid sized by the median box would register in
+    thousands of cells.
+    """
+    rng = np.random.default_rng(seed)
+    lines = synthetic_page(small, width, height, seed)
+    x = rng.uniform(0, 200, large)
+    y = rng.uniform(0, 300, large)
+    w = rng.uniform(width * 0.6, width - 200, large)
+    h = rng.uniform(height * 0.5, height - 300, large)
+    xywh = np.concatenate([lines.xywh, np.stack([x, y, w, h], axis=1)])
+    labels = np.concatenate([lines.labels, rng.choice([3, 4], large)])
+    return boxes.Boxes.from_xywh(xywh, labels, rng.random(small + large))
+
+
+def check_paths_agree(page):
+    # the dense path of overlapping_pairs against the swept one
+    dense_max = boxes.DENSE_MAX_BOXES
+    boxes.DENSE_MAX_BOXES = len(page)
+    try:
+        dense = boxes.overlapping_pairs(page)
+    finally:
+        boxes.DENSE_MAX_BOXES = dense_max
+    sweep = boxes.overlapping_pairs(page)
+    assert sorted(zip(*map(np.ndarray.tolist, dense))) == sorted(zip(*map(np.ndarray.tolist, sweep)))
+
+
+def timed(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def python_iou_matrix(xywh):
+    rows = xywh.tolist()
+    return [[calculate_iou(a, b) if a[2] * a[3] + b[2] * b[3] > 0 else 0 for b in rows] for a in rows]
+
+
+if __name__ == "__main__":
+    sizes = [int(n) for n in sys.argv[1:]] or [1000, 2000, 5000]
+
+    page = mixed_page()
+    print(f"--- mixed page, {len(page)} boxes (300 lines, 100 page-sized)")
+    check_paths_agree(page)
+    ms, (merged, _) = timed(lambda: boxes.merge_overlapping(page))
+    print(f"class-aware merge     : {ms:9.1f} ms ({len(page)} -> {len(merged)} boxes)")
+
+    for n in sizes:
+        page = synthetic_page(n)
+        print(f"--- {n} boxes")
+
+        if n <= 2000:
+            ms, py = timed(lambda: python_iou_matrix(page.xywh), repeat=1)
+            print(f"python pairwise IoU   : {ms:9.1f} ms")
+        ms, np_iou = timed(lambda: boxes.iou_matrix(page.xyxy, page.xyxy))
+        print(f"vectorized IoU matrix : {ms:9.1f} ms")
+        if n <= 2000:
+            assert np.allclose(np.asarray(py), np_iou)
+
+        if n <= 2000:
+            check_paths_agree(page)
+        ms, (i, j) = timed(lambda: boxes.candidate_pairs(page.xyxy))
+        print(f"swept candidate pairs : {ms:9.1f} ms ({len(i)} of {n * (n - 1) // 2} pairs)")
+
+        ms, (merged, _) = timed(lambda: boxes.merge_overlapping(page))
+        print(f"class-aware merge     : {ms:9.1f} ms ({n} -> {len(merged)} boxes)")
+
+        ms, keep = timed(lambda: boxes.suppress_overlapping(page))
+        print(f"class-aware NMS       : {ms:9.1f} ms ({n} -> {len(keep)} boxes)")
+
+        ms, _ = timed(lambda: boxes.reading_order(merged, 2480))
+        print(f"reading order         : {ms:9.1f} ms")
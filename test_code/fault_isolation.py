@@ -0,0 +1,118 @@
+"""
+Runs batch_runner.run_pages over synthetic pages of which some hang,
+crash their worker or raise, and checks that every good page still gets
+done, the bad ones end up quarantined and the run takes no longer than
+the good pages plus the time lost to the bad ones. Also checks workers
+that hang while initialising.
+
+    python test_code/fault_isolation.py [pages] [workers]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from batch_runner import run_pages
+
+PAGE_SECONDS = 0.05
+PAGE_TIMEOUT = 1.0
+INIT_SECONDS = 0.2
+START_TIMEOUT = 1.0
+
+
+def init(slot, hang_once=None):
+    # stands in for loading the model
+    if hang_once is not None and slot == 0 and not os.path.exists(hang_once):
+        open(hang_once, 'w').close()
+        time.sleep(3600)
+    time.sleep(INIT_SECONDS)
+
+
+def init_hangs(slot):
+    time.sleep(3600)
+
+
+def work(name):
+    if name.startswith("hang"):
+        time.sleep(3600)
+    elif name.startswith("crash"):
+        os._exit(1)
+    elif name.startswith("corrupt"):
+        raise ValueError(f"cannot decode {name}")
+    time.sleep(PAGE_SECONDS)
+
+
+def check_poison_pages(pages, workers):
+    names = [f"page_{i:04d}.png" for i in range(pages)]
+    poison = ["hang_1.png", "crash_1.png", "corrupt_1.png", "hang_2.png"]
+    # spread the poison pages through the batch
+    for k, name in enumerate(poison):
+        names.insert((k + 1) * len(names) // (len(poison) + 1), name)
+
+    start = time.perf_counter()
+    summary = run_pages(
+        [(name, (name,)) for name in names],
+        work,
+        workers=workers,
+        init=init,
+        init_args=[(slot,) for slot in range(workers)],
+        page_timeout=PAGE_TIMEOUT,
+    )
+    elapsed = time.perf_counter() - start
+
+    for entry in summary["quarantined"]:
+        print(f"quarantined {entry['key']:14s} {entry['reason']:8s} after {entry['attempts']} attempt(s)")
+    assert summary["done"] == pages, summary["done"]
+    assert sorted(e["key"] for e in summary["quarantined"]) == sorted(poison)
+
+    # the good pages spread over the workers, plus every attempt at a hung
+    # page holding one worker for PAGE_TIMEOUT and the restarted workers
+    # initialising again. The slack covers process start-up; a hang that
+    # stalls the whole pool instead of one worker doesn't fit in it
+    hung_attempts = sum(e["attempts"] for e in summary["quarantined"] if e["reason"] == "timeout")
+    budget = (
+        (pages * PAGE_SECONDS + hung_attempts * PAGE_TIMEOUT) / workers
+        + (1 + summary["restarts"]) * INIT_SECONDS
+    )
+    print(f"{summary['done']} pages done in {elapsed:.1f}s (budget {budget:.1f}s), {summary['restarts']} worker restarts")
+    assert elapsed < 1.25 * budget + 1.0, (elapsed, budget)
+
+
+def check_hung_start(workers):
+    # the first start of the only worker hangs, it gets restarted and the
+    # batch finishes
+    with tempfile.TemporaryDirectory() as tmp:
+        summary = run_pages(
+            [(f"page_{i}", (f"page_{i}",)) for i in range(20)],
+            work,
+            workers=1,
+            init=init,
+            init_args=[(0, os.path.join(tmp, "hung"))],
+            start_timeout=START_TIMEOUT,
+        )
+    assert summary["done"] == 20 and summary["restarts"] == 1, summary
+    print("worker hung in init: restarted, all pages done")
+
+    # workers that never get ready abort the run instead of waiting forever
+    start = time.perf_counter()
+    try:
+        run_pages(
+            [("page_0", ("page_0",))],
+            work,
+            workers=workers,
+            init=init_hangs,
+            init_args=[(slot,) for slot in range(workers)],
+            start_timeout=START_TIMEOUT,
+        )
+    except RuntimeError as e:
+        print(f"all workers hung in init: aborted after {time.perf_counter() - start:.1f}s ({e})")
+    else:
+        raise AssertionError("run with hung workers did not abort")
+
+
+if __name__ == "__main__":
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    check_poison_pages(pages, workers)
+    check_hung_start(workers)
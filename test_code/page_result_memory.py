@@ -0,0 +1,72 @@
+"""
+Memory footprint of a batch of results held as the nested JSON dicts,
+as PageResult objects and as one packed PageBatch, plus a lossless
+round trip check of the conversions.
+
+    python test_code/page_result_memory.py [pages] [boxes_per_page]
+"""
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from page_result import PageResult, PageBatch, CATEGORY_NAMES
+
+
+def synthetic_page(i, boxes, rng):
+    categories = rng.choice(list(CATEGORY_NAMES), boxes).tolist()
+    xywh = np.round(rng.uniform(0, 3000, (boxes, 4)), 2).tolist()
+    scores = np.round(rng.uniform(0.2, 1, boxes), 3).tolist()
+    return {
+        "file_name": f"doc_{i:06d}.png",
+        "width": 2480,
+        "height": 3508,
+        "deskew_angle": round(float(rng.uniform(-5, 5)), 2),
+        "annotations": [
+            {"bbox": bbox, "category_id": cat, "category_name": CATEGORY_NAMES[cat], "score": score}
+            for bbox, cat, score in zip(xywh, categories, scores)
+        ],
+    }
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size, elapsed
+
+
+if __name__ == "__main__":
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    boxes = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    rng = np.random.default_rng(0)
+
+    # pages as they come off disk, one JSON string each
+    lines = [json.dumps(synthetic_page(i, boxes, rng)) for i in range(pages)]
+
+    for line in lines[:1000]:
+        assert PageResult.from_dict(json.loads(line)).to_dict() == json.loads(line)
+    batch = PageBatch(PageResult.from_dict(json.loads(line)) for line in lines[:1000])
+    for page, line in zip(batch, lines):
+        assert page.to_dict() == json.loads(line)
+    print("round trip: ok")
+
+    print(f"{pages} pages x {boxes} boxes")
+    dicts, size, elapsed = measure(lambda: [json.loads(line) for line in lines])
+    print(f"nested dicts : {size / 1e6:9.1f} MB  ({elapsed:5.1f} s to load)")
+    del dicts
+
+    results, size, elapsed = measure(lambda: [PageResult.from_dict(json.loads(line)) for line in lines])
+    print(f"PageResult   : {size / 1e6:9.1f} MB  ({elapsed:5.1f} s to load)")
+
+    packed, size, elapsed = measure(lambda: PageBatch(results))
+    del results
+    print(f"PageBatch    : {size / 1e6:9.1f} MB  (arrays {packed.nbytes() / 1e6:.1f} MB)")
@@ -0,0 +1,116 @@
+"""
+Renders a synthetic batch with draw_bounding_box.render_batch, once from a
+directory of per-file JSONs and once from a .jsonl shard, and checks the
+thumbnail sizes, that the boxes are scaled onto the thumbnails and the
+index.html contact sheet.
+
+    python test_code/render_batch_check.py
+"""
+import json
+import os
+import sys
+import tempfile
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import draw_bounding_box
+
+THUMB_WIDTH = 500
+TABLE = 4  # drawn in CATEGORY_COLORS[4]
+
+# (name, width, height, [x, y, w, h] of one Table box)
+PAGES = [
+    ("doc_00001", 2000, 2800, [400, 600, 800, 400]),  # reduced decode 1/4, no resize
+    ("doc_00002", 1800, 2400, [360, 480, 720, 600]),  # reduced decode 1/2, then resized
+    ("doc_00003", 400, 600, [40, 60, 200, 100]),      # narrower than the thumbnail
+    ("doc_00004", 2000, 2800, []),                    # no annotations
+    ("doc_00006", 2480, 3508, [496, 700, 992, 350]),  # JPEG, size from the SOF marker
+]
+JPEG_PAGES = {"doc_00006"}
+
+
+def make_batch(root):
+    image_dir = os.path.join(root, "images")
+    json_dir = os.path.join(root, "json")
+    os.makedirs(image_dir)
+    os.makedirs(json_dir)
+    lines = []
+    for name, width, height, bbox in PAGES:
+        ext = ".jpg" if name in JPEG_PAGES else ".png"
+        cv2.imwrite(os.path.join(image_dir, name + ext), np.full((height, width, 3), 255, np.uint8))
+        page = {
+            "file_name": name + ext,
+            "width": width,
+            "height": height,
+            "annotations": [{"bbox": bbox, "category_id": TABLE, "category_name": "Table"}] if bbox else [],
+        }
+        with open(os.path.join(json_dir, name + ".json"), 'w') as f:
+            json.dump(page, f)
+        lines.append(json.dumps(page))
+    # a page whose image can't be decoded
+    with open(os.path.join(image_dir, "doc_00005.png"), 'wb') as f:
+        f.write(b"not a png")
+    page = {"file_name": "doc_00005.png", "annotations": []}
+    with open(os.path.join(json_dir, "doc_00005.json"), 'w') as f:
+        json.dump(page, f)
+    lines.append(json.dumps(page))
+    jsonl_path = os.path.join(root, "shard.jsonl")
+    with open(jsonl_path, 'w') as f:
+        f.write("\n".join(lines) + "\n")
+    return image_dir, json_dir, jsonl_path
+
+
+def check_output(output_dir, rendered):
+    status = {base_name: (s, count) for base_name, _, s, count in rendered}
+    assert status["doc_00005"] == ("unreadable", 0), status["doc_00005"]
+    color = np.array(draw_bounding_box.CATEGORY_COLORS[TABLE])
+
+    for name, width, height, bbox in PAGES:
+        assert status[name] == ("ok", 1 if bbox else 0), (name, status[name])
+        thumb = cv2.imread(os.path.join(output_dir, name + "_annotated.png"))
+        expected_width = min(width, THUMB_WIDTH)
+        assert thumb.shape[1] == expected_width, (name, thumb.shape)
+        assert abs(thumb.shape[0] - height * expected_width / width) <= 1, (name, thumb.shape)
+        if not bbox:
+            continue
+        # the left edge of the box, halfway down, must be drawn where the
+        # scaled box is, give or take rounding
+        scale = expected_width / width
+        x = round(bbox[0] * scale)
+        y = round((bbox[1] + bbox[3] / 2) * scale)
+        patch = thumb[y - 1:y + 2, x - 2:x + 3].reshape(-1, 3)
+        assert (patch == color).all(axis=1).any(), (name, x, y)
+        # and nowhere near the unscaled position
+        x_full = min(bbox[0], thumb.shape[1] - 3)
+        if abs(x_full - x) > 4:
+            patch = thumb[y - 1:y + 2, x_full - 2:x_full + 3].reshape(-1, 3)
+            assert not (patch == color).all(axis=1).any(), name
+
+    with open(os.path.join(output_dir, "index.html")) as f:
+        index = f.read()
+    assert f"{len(PAGES) + 1} pages" in index
+    for name, *_ in PAGES:
+        assert f'src="{name}_annotated.png"' in index, name
+    # unreadable pages first, then empty ones
+    assert index.index("doc_00005") < index.index("doc_00004") < index.index("doc_00001")
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as root:
+        image_dir, json_dir, jsonl_path = make_batch(root)
+        for label, source in (("directory", json_dir), ("jsonl", jsonl_path)):
+            output_dir = os.path.join(root, "out_" + label)
+            rendered = draw_bounding_box.render_batch(
+                image_dir, source, output_dir, thumb_width=THUMB_WIDTH, max_workers=2, window=2
+            )
+            check_output(output_dir, rendered)
+            print(f"{label}: ok")
+
+        # error messages go into the page escaped
+        out = os.path.join(root, "out_escape")
+        os.makedirs(out)
+        draw_bounding_box.write_index(out, [("doc", "doc.png", "error: <script>", 0)], THUMB_WIDTH)
+        with open(os.path.join(out, "index.html")) as f:
+            assert "error: &lt;script&gt;" in f.read()
+        print("index escaping: ok")
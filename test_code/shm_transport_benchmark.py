@@ -0,0 +1,179 @@
+"""
+Compares passing full pages from worker processes through
+ProcessPoolExecutor results (pickled through a pipe) with the shared
+memory PageRing in shm_transport.py.
+
+Workers only fill a synthetic page so the numbers are transport overhead,
+not deskew time. It also checks that iter_deskewed shuts down when its
+consumer raises while the ring is full, and when a deskew hangs.
+
+    python test_code/shm_transport_benchmark.py [pages] [workers]
+"""
+import multiprocessing as mp
+import os
+import pickle
+import signal
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import shm_transport
+
+PAGE_SHAPE = (3508, 2480, 3)  # A4 at 300 dpi
+
+
+def make_page(i):
+    page = np.empty(PAGE_SHAPE, dtype=np.uint8)
+    page.fill(i % 256)
+    return page
+
+
+def page_to_ring(i):
+    shm_transport._ring.put(make_page(i), {"i": i})
+
+
+def bench_pickle(repeat=20):
+    page = make_page(0)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        pickle.loads(pickle.dumps(page, protocol=pickle.HIGHEST_PROTOCOL))
+    elapsed = time.perf_counter() - start
+    return page.nbytes * repeat / elapsed / 1e9
+
+
+def bench_executor(pages, workers):
+    checksum = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for page in executor.map(make_page, range(pages)):
+            checksum += int(page[0, 0, 0])
+    return time.perf_counter() - start, checksum
+
+
+def bench_ring(pages, workers):
+    checksum = 0
+    start = time.perf_counter()
+    nbytes = int(np.prod(PAGE_SHAPE))
+    with shm_transport.PageRing(workers * 2, nbytes) as ring, ProcessPoolExecutor(
+        max_workers=workers, initializer=shm_transport.init_worker, initargs=(ring,)
+    ) as executor:
+        for i in range(pages):
+            executor.submit(page_to_ring, i)
+        for _ in range(pages):
+            slot, page, _ = ring.receive()
+            checksum += int(page[0, 0, 0])
+            del page
+            ring.release(slot)
+    return time.perf_counter() - start, checksum
+
+
+def bench_baseline(pages):
+    """time to produce the pages with no transport at all"""
+    checksum = 0
+    start = time.perf_counter()
+    for i in range(pages):
+        checksum += int(make_page(i)[0, 0, 0])
+    return time.perf_counter() - start, checksum
+
+
+def consume_and_fail(img_paths, n_slots):
+    # own process group, so a hung run can be killed with its pool workers
+    os.setpgrp()
+    for image, meta in shm_transport.iter_deskewed(img_paths, workers=2, n_slots=n_slots):
+        raise RuntimeError("consumer failed")
+
+
+def consume_with_hung_page(img_paths, stall_timeout):
+    os.setpgrp()
+    import deskew_clustering
+    deskew = deskew_clustering.deskew_image_with_angle
+
+    def deskew_or_hang(img_path, propagator=None):
+        if "hang" in img_path:
+            time.sleep(3600)
+        return deskew(img_path, propagator)
+
+    # inherited by the forked pool workers
+    deskew_clustering.deskew_image_with_angle = deskew_or_hang
+    received = 0
+    try:
+        for image, meta in shm_transport.iter_deskewed(img_paths, workers=2, stall_timeout=stall_timeout):
+            received += 1
+    except TimeoutError:
+        # every page but the hung one came through
+        sys.exit(0 if received == len(img_paths) - 1 else 3)
+    sys.exit(4)
+
+
+def write_pages(directory, pages):
+    img_paths = []
+    for i in range(pages):
+        page = np.full((600, 450, 3), 255, np.uint8)
+        for y in range(60, 560, 30):
+            cv2.rectangle(page, (40, y), (410, y + 12), (0, 0, 0), -1)
+        img_paths.append(os.path.join(directory, f"page_{i:03d}.png"))
+        cv2.imwrite(img_paths[-1], page)
+    return img_paths
+
+
+def run_child(target, args, timeout, what):
+    start = time.perf_counter()
+    child = mp.Process(target=target, args=args)
+    child.start()
+    child.join(timeout)
+    if child.is_alive():
+        os.killpg(child.pid, signal.SIGKILL)
+        raise AssertionError(f"iter_deskewed still running {timeout}s after {what}")
+    return child.exitcode, time.perf_counter() - start
+
+
+def check_consumer_failure(pages=20, n_slots=2, timeout=30):
+    """
+    A consumer raising on the first page must not leave the pool waiting
+    for producers blocked on a full ring.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        img_paths = write_pages(tmp, pages)
+        exitcode, elapsed = run_child(consume_and_fail, (img_paths, n_slots), timeout, "its consumer raised")
+        assert exitcode != 0, "consumer error was swallowed"
+        return elapsed
+
+
+def check_hung_deskew(pages=10, stall_timeout=2, timeout=30):
+    """
+    A deskew that never returns must end the iteration with TimeoutError
+    instead of stalling it forever.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        img_paths = write_pages(tmp, pages)
+        img_paths.insert(pages // 2, os.path.join(tmp, "hang.png"))
+        exitcode, elapsed = run_child(
+            consume_with_hung_page, (img_paths, stall_timeout), timeout, "a deskew hung"
+        )
+        assert exitcode == 0, exitcode
+        return elapsed
+
+
+if __name__ == "__main__":
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    mb = np.prod(PAGE_SHAPE) / 1e6
+
+    print(f"page: {PAGE_SHAPE} ({mb:.1f} MB), {pages} pages, {workers} workers")
+    print(f"pickle round trip : {bench_pickle():.2f} GB/s")
+
+    baseline, expected = bench_baseline(pages)
+    print(f"no transport      : {pages / baseline:7.1f} pages/s (single process)")
+    for name, bench in (("executor results", bench_executor), ("shared memory", bench_ring)):
+        elapsed, checksum = bench(pages, workers)
+        assert checksum == expected, name
+        print(f"{name:<18}: {pages / elapsed:7.1f} pages/s, {elapsed / pages * 1000:6.1f} ms per page")
+
+    elapsed = check_consumer_failure()
+    print(f"consumer failure  : shut down in {elapsed:.1f}s")
+    elapsed = check_hung_deskew()
+    print(f"hung deskew       : gave up in {elapsed:.1f}s")
@@ -0,0 +1,115 @@
+"""
+Checks deskew_clustering.verify_angle on a synthetic skewed page (accepts
+the estimated angle, rejects priors 1 degree or more off, and how long it
+takes) and the document grouping of SkewPropagator.
+
+    python test_code/skew_propagation_check.py
+"""
+import os
+import sys
+import tempfile
+import time
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import deskew_clustering as dc
+
+PAGE_SHAPE = (3300, 2550)  # letter at 300 dpi
+WRONG_BY = (1.0, 2.0, 5.0)
+MAX_VERIFY_MS = 50
+
+
+def synthetic_page(skew, seed=0):
+    """
+    Two columns of justified paragraphs of word-like blocks, rotated so
+    that deskewing it takes a rotation of about `skew` degrees.
+    """
+    rng = np.random.default_rng(seed)
+    height, width = PAGE_SHAPE
+    page = np.full((height, width, 3), 255, np.uint8)
+    for x0 in (200, 1350):
+        y = 250
+        while y < height - 600:
+            for _ in range(int(rng.integers(5, 9))):
+                x = x0
+                while x < x0 + 960:
+                    word = min(int(rng.uniform(30, 90)), x0 + 1000 - x)
+                    cv2.rectangle(page, (x, y), (x + word, y + 26), (0, 0, 0), -1)
+                    x += word + 16
+                y += 45
+            y += 130
+    return dc.rotate(page, -skew)
+
+
+def check_verify():
+    skewed = synthetic_page(3.0)
+    _, _, angle = dc.deskew(skewed)
+    assert abs(angle - 3.0) < 0.5, angle
+    assert dc.verify_angle(skewed, angle), "estimated angle rejected"
+    for wrong in WRONG_BY:
+        for prior in (angle - wrong, angle + wrong):
+            assert not dc.verify_angle(skewed, prior), f"prior {prior:.2f} accepted for page at {angle:.2f}"
+    assert not dc.verify_angle(np.full_like(skewed, 255), 0), "blank page accepted"
+
+    times = []
+    for _ in range(20):
+        start = time.perf_counter()
+        dc.verify_angle(skewed, angle)
+        times.append(time.perf_counter() - start)
+    verify_ms = float(np.median(times)) * 1000
+    assert verify_ms < MAX_VERIFY_MS, verify_ms
+
+    start = time.perf_counter()
+    dc.deskew(skewed)
+    full_ms = (time.perf_counter() - start) * 1000
+    print(f"estimated angle {angle:.2f}, rejects priors off by {', '.join(map(str, WRONG_BY))} degrees")
+    print(f"verify_angle {verify_ms:.1f} ms, full estimation {full_ms:.0f} ms")
+
+
+def check_grouping(tmp):
+    # two documents skewed differently, pages interleaved
+    skews = {"alpha": 2.0, "beta": -3.0}
+    flat_dir = os.path.join(tmp, "flat")
+    os.makedirs(flat_dir)
+    flat, nested = [], []
+    for page_no in range(1, 4):
+        for doc, skew in skews.items():
+            image = synthetic_page(skew, seed=page_no)
+            name = f"{doc}_p{page_no:03d}.png"
+            flat.append(os.path.join(flat_dir, name))
+            cv2.imwrite(flat[-1], image)
+            os.makedirs(os.path.join(tmp, doc), exist_ok=True)
+            nested.append(os.path.join(tmp, doc, name))
+            cv2.imwrite(nested[-1], image)
+
+    def run(paths, key):
+        propagator = dc.SkewPropagator(key)
+        for path in paths:
+            dc.deskew_image_with_angle(path, propagator)
+        return propagator.report()
+
+    for label, paths, key in (
+        ("regex_key", flat, dc.regex_key(r"^(.*)_p\d+")),
+        ("directory_key", nested, dc.directory_key),
+    ):
+        report = run(paths, key)
+        assert report["documents"] == 2 and report["fast_pages"] == 4, (label, report)
+        print(f"{label:14s}: {report['documents']} documents, {report['fast_pages']}/6 pages on the fast path")
+
+    # one directory of interleaved documents is one document: every prior
+    # is verified and rejected, nothing takes the fast path
+    report = run(flat, dc.directory_key)
+    assert report["documents"] == 1 and report["fast_pages"] == 0, report
+    # and the failed checks count against the fast path
+    assert report["rejected_priors"] == 5 and report["time_saved_s"] < 0, report
+    print(f"flat directory: {report['documents']} document, {report['fast_pages']}/6 pages on the fast path")
+
+    key = dc.regex_key(r"^(.*)_p\d+")
+    assert key("/x/doc_02275.png") == "/x/doc_02275.png"
+
+
+if __name__ == "__main__":
+    check_verify()
+    with tempfile.TemporaryDirectory() as tmp:
+        check_grouping(tmp)
@@ -0,0 +1,82 @@
+"""
+Startup regression check for the CLI.
+
+Runs `python -X importtime -m layout_cli <subcommand> --help` for every
+subcommand and fails if a heavy module gets imported or the cumulative
+import time goes over the budget.
+
+    python test_code/startup_importtime.py
+"""
+import os
+import subprocess
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# none of these may be imported just to parse arguments
+HEAVY_MODULES = {
+    "torch", "ultralytics", "doclayout_yolo", "sklearn", "cv2",
+    "numpy", "skimage", "deskew",
+}
+IMPORT_BUDGET_MS = 150
+
+COMMANDS = [
+    ["--help"],
+    ["infer", "--help"],
+    ["deskew", "--help"],
+    ["draw", "--help"],
+    ["eval", "--help"],
+    ["check", "--help"],
+    ["tune", "--help"],
+]
+
+
+def import_times(args):
+    """
+    Returns ({module: cumulative import time in us}, total time in us of
+    the top level imports) for one run.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "layout_cli", *args],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise AssertionError(f"{args} exited with {proc.returncode}:\n{proc.stderr}")
+    times = {}
+    total = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+        # nested imports are indented and already counted by their parent
+        if len(name) - len(name.lstrip()) == 1:
+            total += int(cumulative)
+    return times, total
+
+
+def test_startup(args):
+    times, total = import_times(args)
+    heavy = sorted(
+        name for name in times if name.split(".")[0] in HEAVY_MODULES
+    )
+    assert not heavy, f"{' '.join(args)} imported {heavy}"
+    total_ms = total / 1000
+    assert total_ms < IMPORT_BUDGET_MS, (
+        f"{' '.join(args)}: imports took {total_ms:.0f} ms"
+    )
+    return total_ms
+
+
+if __name__ == "__main__":
+    failed = False
+    for args in COMMANDS:
+        try:
+            total_ms = test_startup(args)
+            print(f"ok    {' '.join(args):<16} {total_ms:6.1f} ms")
+        except AssertionError as e:
+            failed = True
+            print(f"FAIL  {e}")
+    sys.exit(1 if failed else 0)
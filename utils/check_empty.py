@@ -1,25 +1,262 @@
 import os
+import sys
 import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 
-# Specify the directory containing the JSON files
-directory = '.'  # Change this to the path of your directory if needed
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+# page_result (and with it numpy) is imported in the workers only, so
+# `layout_cli check --help` stays fast
 
-empty_annotation_files = []
+# Default thresholds for the anomaly checks
+MAX_BOXES = 150     # more boxes than this on one page is suspicious
+MIN_BOX_AREA = 1.0  # boxes smaller than this (in px^2) are degenerate
+BOUNDS_TOLERANCE = 2.0  # px a box may stick out of the page
+MAX_DESKEW_ANGLE = 10.0  # degrees
 
-for filename in os.listdir(directory):
-    if filename.endswith('.json'):
-        filepath = os.path.join(directory, filename)
+# Issues that mean the page should be run through inference again
+REQUEUE_ISSUES = {"unreadable", "empty", "too_many_boxes", "extreme_deskew_angle"}
+
+
+def check_page(page, max_boxes=MAX_BOXES, min_area=MIN_BOX_AREA, max_angle=MAX_DESKEW_ANGLE):
+    """
+    Returns the list of issues found on one PageResult. `width`, `height`
+    and `deskew_angle` are only checked when the page records them.
+    """
+    issues = []
+    if not len(page):
+        issues.append("empty")
+    elif len(page) > max_boxes:
+        issues.append("too_many_boxes")
+
+    x, y, w, h = page.bboxes.T
+    if ((w <= 0) | (h <= 0) | (w * h < min_area)).any():
+        issues.append("zero_area_box")
+    out_of_bounds = (x < -BOUNDS_TOLERANCE) | (y < -BOUNDS_TOLERANCE)
+    if page.width and page.height:
+        out_of_bounds |= (x + w > page.width + BOUNDS_TOLERANCE) | (y + h > page.height + BOUNDS_TOLERANCE)
+    if out_of_bounds.any():
+        issues.append("out_of_bounds_box")
+
+    if page.deskew_angle is not None and abs(page.deskew_angle) > max_angle:
+        issues.append("extreme_deskew_angle")
+    return issues
+
+
+def _page_record(file_name, source, page, issues):
+    return {
+        "file_name": file_name,
+        "source": source,
+        "num_boxes": len(page) if page is not None else 0,
+        "issues": issues,
+    }
+
+
+def scan_files(paths, thresholds):
+    """
+    Checks a chunk of per-file JSONs. Runs inside the worker processes.
+    Only pages with at least one issue are returned.
+    """
+    from page_result import load_page
+    records = []
+    for path in paths:
+        name = os.path.basename(path)
         try:
-            with open(filepath, 'r') as f:
-                data = json.load(f)
-                if 'annotations' in data and data['annotations'] == []:
-                    empty_annotation_files.append(filename)
-        except json.JSONDecodeError:
-            print(f"Error decoding {filename}. Skipping.")
-        except Exception as e:
-            print(f"Error processing {filename}: {e}. Skipping.")
-
-# Output the list of JSON files with empty annotations
-print("JSON files with empty annotations:")
-for file in empty_annotation_files:
-    print(file)
+            page = load_page(path)
+            issues = check_page(page, **thresholds)
+        except (OSError, ValueError, KeyError, TypeError):
+            records.append(_page_record(os.path.splitext(name)[0], path, None, ["unreadable"]))
+            continue
+        if issues:
+            file_name = page.file_name or os.path.splitext(name)[0]
+            records.append(_page_record(file_name, path, page, issues))
+    return records, len(paths)
+
+
+def scan_lines(source, lines, thresholds):
+    """
+    Checks a chunk of (line number, line) from a consolidated JSON-lines
+    shard. Flagged pages are recorded as "<shard>:<line number>".
+    """
+    return _scan_entries(source + ":{}", lines, json.loads, thresholds)
+
+
+def scan_pages(source, pages, thresholds):
+    """
+    Checks a chunk of (index, page dict) from a consolidated JSON file
+    holding a list of pages. Flagged pages are recorded as
+    "<file>[<index>]".
+    """
+    return _scan_entries(source + "[{}]", pages, lambda page: page, thresholds)
+
+
+def _scan_entries(location, entries, decode, thresholds):
+    from page_result import PageResult
+    records = []
+    for position, entry in entries:
+        data = None
+        try:
+            data = decode(entry)
+            page = PageResult.from_dict(data)
+            issues = check_page(page, **thresholds)
+        except (ValueError, KeyError, TypeError):
+            # keep the file name when the entry at least parsed, so it can be re-queued
+            file_name = data.get("file_name") if isinstance(data, dict) else None
+            records.append(_page_record(file_name, location.format(position), None, ["unreadable"]))
+            continue
+        if issues:
+            records.append(_page_record(page.file_name, location.format(position), page, issues))
+    return records, len(entries)
+
+
+def _json_chunks(directory, chunk_size, skip=()):
+    chunk = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.endswith('.json') and entry.is_file() and os.path.abspath(entry.path) not in skip:
+                chunk.append(entry.path)
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+    if chunk:
+        yield chunk
+
+
+def _line_chunks(path, chunk_size):
+    chunk = []
+    with open(path, 'rb') as f:
+        for line_no, line in enumerate(f, 1):
+            if line.strip():
+                chunk.append((line_no, line))
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+    if chunk:
+        yield chunk
+
+
+def _page_chunks(path, chunk_size):
+    # a consolidated .json has to be parsed whole, only the checks are chunked
+    with open(path, 'rb') as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = [data]
+    pages = list(enumerate(data))
+    for start in range(0, len(pages), chunk_size):
+        yield pages[start:start + chunk_size]
+
+
+def scan(source, max_workers=None, chunk_size=512, window=None, skip=(), **thresholds):
+    """
+    Scans a directory of per-file JSONs, a consolidated .jsonl shard or a
+    consolidated .json list of pages in parallel and returns a report dict
+    with per-issue counts and the flagged pages. Raises ValueError for any
+    other source.
+
+    Chunks are read lazily with at most `window` of them in flight, so a
+    large shard is streamed rather than loaded up front. Files listed in
+    `skip` (e.g. an earlier report) are not scanned.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    window = window or max_workers * 2
+    skip = {os.path.abspath(path) for path in skip}
+    flagged = []
+    total = 0
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        if os.path.isdir(source):
+            jobs = ((scan_files, chunk, thresholds) for chunk in _json_chunks(source, chunk_size, skip))
+        elif source.endswith('.jsonl'):
+            jobs = ((scan_lines, source, chunk, thresholds) for chunk in _line_chunks(source, chunk_size))
+        elif source.endswith('.json'):
+            jobs = ((scan_pages, source, chunk, thresholds) for chunk in _page_chunks(source, chunk_size))
+        else:
+            raise ValueError(f"{source}: expected a directory, a .jsonl or a .json file")
+        pending = set()
+
+        def collect(done):
+            nonlocal total
+            for future in done:
+                pending.discard(future)
+                records, count = future.result()
+                flagged.extend(records)
+                total += count
+
+        for fn, *args in jobs:
+            pending.add(executor.submit(fn, *args))
+            if len(pending) >= window:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+        collect(pending.copy())
+
+    counts = {}
+    for record in flagged:
+        for issue in record["issues"]:
+            counts[issue] = counts.get(issue, 0) + 1
+    flagged.sort(key=lambda r: str(r["file_name"]))
+    return {
+        "source": source,
+        "total_pages": total,
+        "flagged_pages": len(flagged),
+        "issue_counts": counts,
+        "pages": flagged,
+    }
+
+
+def requeue_list(report, issues=REQUEUE_ISSUES):
+    """
+    File names of the flagged pages that should be run through inference
+    again, in the format read by `inference.get_input_files`.
+    """
+    return [
+        record["file_name"]
+        for record in report["pages"]
+        if record["file_name"] and issues.intersection(record["issues"])
+    ]
+
+
+def write_report(report, report_path, requeue_path=None):
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    if requeue_path:
+        with open(requeue_path, 'w') as f:
+            for file_name in requeue_list(report):
+                f.write(file_name + "\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Flag empty and anomalous layout outputs."
+    )
+    parser.add_argument("source", nargs="?", default=".", help="directory of per-file JSONs, or a consolidated .jsonl shard or .json list")
+    parser.add_argument("--report", default="scan_report.json", help="where to write the JSON report")
+    parser.add_argument("--requeue", default="requeue.txt", help="where to write the re-queue list for inference")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-boxes", type=int, default=MAX_BOXES)
+    parser.add_argument("--min-area", type=float, default=MIN_BOX_AREA)
+    parser.add_argument("--max-angle", type=float, default=MAX_DESKEW_ANGLE)
+    args = parser.parse_args(argv)
+
+    try:
+        report = scan(
+            args.source,
+            max_workers=args.workers,
+            skip=(args.report, args.requeue),
+            max_boxes=args.max_boxes,
+            min_area=args.min_area,
+            max_angle=args.max_angle,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    write_report(report, args.report, args.requeue)
+
+    print(f"Scanned {report['total_pages']} pages, flagged {report['flagged_pages']}:")
+    for issue, count in sorted(report["issue_counts"].items()):
+        print(f"  {issue}: {count}")
+    print(f"Report written to {args.report}, re-queue list to {args.requeue}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
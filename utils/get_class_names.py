@@ -1,11 +1,16 @@
-from ultralytics import YOLO
-model = YOLO('./docLayout.pt')
+def main(model_path='./docLayout.pt'):
+    from ultralytics import YOLO
+    model = YOLO(model_path)
 
-class_names = model.names
+    class_names = model.names
 
-print("Class IDs and names:")
-for class_id, class_name in class_names.items():
-    print(f"ID: {class_id}, Name: {class_name}")
+    print("Class IDs and names:")
+    for class_id, class_name in class_names.items():
+        print(f"ID: {class_id}, Name: {class_name}")
 
-num_classes = len(class_names)
-print(f"\nTotal number of classes: {num_classes}")
\ No newline at end of file
+    num_classes = len(class_names)
+    print(f"\nTotal number of classes: {num_classes}")
+
+
+if __name__ == "__main__":
+    main()
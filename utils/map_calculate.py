@@ -1,6 +1,12 @@
-import json
 import numpy as np
 import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+from boxes import iou_matrix
+from page_result import load_page
 
 def calculate_iou(boxA, boxB):
     """
@@ -53,66 +59,47 @@ def run_map_calculation(predictions_path, ground_truth_path, iou_threshold=0.5):
     Main function to load data and calculate mAP.
     """
     try:
-        with open(predictions_path, 'r') as f:
-            pred_data = json.load(f)
-        with open(ground_truth_path, 'r') as f:
-            gt_data = json.load(f)
+        pred_page = load_page(predictions_path)
+        gt_page = load_page(ground_truth_path)
     except FileNotFoundError as e:
         print(f"Error: {e}. Please check the file paths.")
         return
+    except (ValueError, KeyError, TypeError) as e:
+        print(f"Error: could not read the annotations: {e}")
+        return
 
-    # Extract annotations and organize by class
-    pred_annotations = {}
-    gt_annotations = {}
-    unique_classes = set()
-
-    for pred in pred_data.get('annotations', []):
-        class_id = pred['category_id']
-        unique_classes.add(class_id)
-        if class_id not in pred_annotations:
-            pred_annotations[class_id] = []
-        # Your generated JSON does not have a confidence score.
-        # We assign a default of 1.0 for all predictions.
-        pred_annotations[class_id].append({
-            'bbox': pred['bbox'],
-            'confidence': 1.0
-        })
+    unique_classes = set(pred_page.category.tolist()) | set(gt_page.category.tolist())
+    # Outputs written without a confidence score get a default of 1.0
+    # for all predictions.
+    if pred_page.score is not None:
+        pred_scores = pred_page.score.astype(np.float64)
+    else:
+        pred_scores = np.ones(len(pred_page))
+    pred_xyxy = pred_page.xyxy
+    gt_xyxy = gt_page.xyxy
 
-    for gt in gt_data.get('annotations', []):
-        class_id = gt['category_id']
-        unique_classes.add(class_id)
-        if class_id not in gt_annotations:
-            gt_annotations[class_id] = []
-        gt_annotations[class_id].append({
-            'bbox': gt['bbox'],
-            'matched': False
-        })
-    
     # Calculate AP for each class
     average_precisions = []
     
-    for class_id in sorted(list(unique_classes)):
-        preds = sorted(pred_annotations.get(class_id, []), key=lambda x: x['confidence'], reverse=True)
-        gts = gt_annotations.get(class_id, [])
+    for class_id in sorted(unique_classes):
+        preds = np.flatnonzero(pred_page.category == class_id)
+        preds = preds[np.argsort(-pred_scores[preds], kind="stable")]
+        gts = np.flatnonzero(gt_page.category == class_id)
         num_gt = len(gts)
         
         tps = np.zeros(len(preds))
         fps = np.zeros(len(preds))
+        matched = np.zeros(num_gt, dtype=bool)
         
         # Match predictions to ground truths
-        for i, pred in enumerate(preds):
-            iou_max = -1
-            best_gt_idx = -1
-            
-            for j, gt in enumerate(gts):
-                iou = calculate_iou(pred['bbox'], gt['bbox'])
-                if iou > iou_max:
-                    iou_max = iou
-                    best_gt_idx = j
-            
-            if iou_max >= iou_threshold and not gts[best_gt_idx]['matched']:
+        if num_gt and len(preds):
+            ious = iou_matrix(pred_xyxy[preds], gt_xyxy[gts])
+            best_gt = ious.argmax(axis=1)
+            best_iou = ious[np.arange(len(preds)), best_gt]
+        for i in range(len(preds)):
+            if num_gt and best_iou[i] >= iou_threshold and not matched[best_gt[i]]:
                 tps[i] = 1
-                gts[best_gt_idx]['matched'] = True
+                matched[best_gt[i]] = True
             else:
                 fps[i] = 1
         
@@ -0,0 +1,255 @@
+import json
+import os
+import time
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+# environment variables read by the OpenMP / BLAS runtimes torch and
+# OpenCV link against, they only take effect before those are imported
+THREAD_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+)
+
+WARMUP_SHAPE = (1024, 768, 3)
+# how long `measure_config` waits for every worker to load and warm up
+STARTUP_TIMEOUT = 600
+
+
+def available_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def default_threads(workers):
+    return max(1, len(available_cpus()) // max(1, workers))
+
+
+def cpu_sets(workers, threads):
+    """
+    Splits the CPUs of this process into `workers` disjoint sets of
+    `threads` CPUs. Returns None when there aren't enough CPUs.
+    """
+    cpus = available_cpus()
+    if workers * threads > len(cpus):
+        return None
+    return [cpus[i * threads:(i + 1) * threads] for i in range(workers)]
+
+
+def set_thread_env(threads):
+    """
+    Limits the OpenMP/BLAS thread pools of the current process. Call it
+    before torch is imported, e.g. first thing in a worker initializer.
+    """
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(threads)
+
+
+def configure_threads(threads):
+    """
+    Sets the torch and OpenCV thread counts of the current process.
+    """
+    set_thread_env(threads)
+    import cv2
+    cv2.setNumThreads(threads)
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(threads)
+    try:
+        # only allowed before the first parallel op of the process
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass
+
+
+def pin_cpus(cpus):
+    """
+    Restricts the current process to `cpus`. Not supported on every
+    platform, in which case this is a no-op.
+    """
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+
+
+def warmup(model, passes=1):
+    """
+    Runs `passes` predictions on a blank page so allocations and kernel
+    selection happen before the first real page is timed.
+    """
+    import numpy as np
+    blank = np.full(WARMUP_SHAPE, 255, dtype=np.uint8)
+    for _ in range(passes):
+        model.predict(blank, imgsz=1024, conf=0.2, device="cpu", verbose=False)
+
+
+def setup_worker(model_path, threads=None, cpus=None, warmup_passes=1):
+    """
+    Pins, sets thread counts, loads and warms up the model of one worker
+    process. Returns the model.
+    """
+    pin_cpus(cpus)
+    if threads is None:
+        threads = len(cpus) if cpus else default_threads(1)
+    set_thread_env(threads)
+    import inference
+    model = inference.load_model(model_path)
+    configure_threads(threads)
+    warmup(model, warmup_passes)
+    return model
+
+
+def make_cpu_queue(workers, threads, pin, ctx=None):
+    """
+    Queue handing each pool worker its own CPU set from its initializer,
+    or None when pinning is off or not possible.
+    """
+    if not pin:
+        return None
+    sets = cpu_sets(workers, threads)
+    if sets is None:
+        print(f"not pinning: {workers} workers x {threads} threads needs more than {len(available_cpus())} CPUs")
+        return None
+    cpu_queue = (ctx or mp.get_context()).Queue()
+    for cpus in sets:
+        cpu_queue.put(cpus)
+    return cpu_queue
+
+
+def load_config(path):
+    """
+    Reads the best configuration written by `autotune`, returns
+    (workers, threads, pin).
+    """
+    with open(path, 'r') as f:
+        config = json.load(f)
+    return config["workers"], config["threads"], config.get("pin", False)
+
+
+def _tune_worker_init(model_path, threads, cpu_queue, warmup_passes, ready):
+    import concurrent_cpu_run
+    cpus = cpu_queue.get() if cpu_queue is not None else None
+    concurrent_cpu_run.init_worker(model_path, threads, cpus, warmup_passes)
+    # hold the worker until every worker of the pool is warm
+    ready.wait()
+
+
+def _start_worker():
+    # submitted once per worker, the pool only starts a process per task
+    # while none is idle
+    pass
+
+
+def _tune_page(img_path):
+    import concurrent_cpu_run
+    import deskew_clustering
+    import inference
+    deskewed, angle = deskew_clustering.deskew_image_with_angle(img_path)
+    inference.detect(os.path.basename(img_path), deskewed, angle, concurrent_cpu_run._model)
+
+
+def measure_config(img_paths, model_path, workers, threads, pin=False, warmup_passes=1):
+    """
+    Pages per second for one (workers x threads) configuration, measured
+    after every worker has loaded and warmed up its model.
+    """
+    ctx = mp.get_context()
+    cpu_queue = make_cpu_queue(workers, threads, pin, ctx)
+    ready = ctx.Barrier(workers + 1)
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=ctx,
+        initializer=_tune_worker_init,
+        initargs=(model_path, threads, cpu_queue, warmup_passes, ready),
+    ) as executor:
+        started = [executor.submit(_start_worker) for _ in range(workers)]
+        ready.wait(timeout=STARTUP_TIMEOUT)
+        for future in started:
+            future.result()
+        start = time.perf_counter()
+        list(executor.map(_tune_page, img_paths))
+        elapsed = time.perf_counter() - start
+    return len(img_paths) / elapsed
+
+
+def sweep(max_cpus):
+    """
+    (workers, threads) pairs to try: threads a power of two and at least
+    half of the CPUs in use, never more than all of them.
+    """
+    configs = []
+    threads = 1
+    while threads <= max_cpus:
+        for workers in range(1, max_cpus // threads + 1):
+            if workers * threads * 2 >= max_cpus:
+                configs.append((workers, threads))
+        threads *= 2
+    return configs
+
+
+def _try_page(img_path):
+    try:
+        _tune_page(img_path)
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+    return None
+
+
+def _sample_images(input_dir, model_path, sample):
+    """
+    The first `sample` images of `input_dir` that go through deskew and
+    detection without an error, so one bad page can't abort the sweep.
+    Tried in a worker process, like the pages of the sweep.
+    """
+    import concurrent_cpu_run
+    from draw_bounding_box import IMAGE_EXTENSIONS
+    candidates = [
+        os.path.join(input_dir, fn)
+        for fn in sorted(os.listdir(input_dir))
+        if os.path.splitext(fn)[1].lower() in IMAGE_EXTENSIONS
+    ]
+    img_paths = []
+    with ProcessPoolExecutor(
+        max_workers=1,
+        mp_context=mp.get_context(),
+        initializer=concurrent_cpu_run.init_worker,
+        initargs=(model_path,),
+    ) as executor:
+        tried = 0
+        while len(img_paths) < sample and tried < len(candidates):
+            # only as many as are still missing, not the whole directory
+            batch = candidates[tried:tried + sample - len(img_paths)]
+            tried += len(batch)
+            for img_path, error in zip(batch, executor.map(_try_page, batch)):
+                if error is not None:
+                    print(f"skipping {os.path.basename(img_path)}: {error}")
+                else:
+                    img_paths.append(img_path)
+    return img_paths
+
+
+def autotune(input_dir, model_path, out_path="tune.json", sample=24, pin=False, configs=None):
+    """
+    Sweeps (workers x threads) over `sample` images of `input_dir` and
+    writes the configuration with the most pages/sec to `out_path`. Only
+    images that deskew and detect cleanly in this process are sampled.
+    """
+    img_paths = _sample_images(input_dir, model_path, sample)
+    if not img_paths:
+        raise ValueError(f"no readable images in {input_dir}")
+    configs = configs or sweep(len(available_cpus()))
+    results = []
+    for workers, threads in configs:
+        pages_per_sec = measure_config(img_paths, model_path, workers, threads, pin)
+        print(f"workers {workers:2d} x threads {threads:2d}: {pages_per_sec:6.2f} pages/s")
+        results.append({"workers": workers, "threads": threads, "pages_per_sec": round(pages_per_sec, 3)})
+    best = max(results, key=lambda r: r["pages_per_sec"])
+    config = dict(best, pin=pin, cpus=len(available_cpus()), sample=len(img_paths), results=results)
+    with open(out_path, 'w') as f:
+        json.dump(config, f, indent=2)
+    print(f"best: {best['workers']} workers x {best['threads']} threads, {best['pages_per_sec']} pages/s -> {out_path}")
+    return config